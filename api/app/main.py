@@ -5,11 +5,11 @@ import asyncstdlib as a
 from pydantic import BaseModel
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 
 from common.db_async import DBSessionDep
-from common.errors import AuthError
+from common.errors import AuthError, NotModifiedError
 from core.auth import OptionalUserDep
 from core.data_api import router as data_api_router
 from core.project import list_projects
@@ -39,6 +39,10 @@ async def auth_error_handler(request, exc: AuthError):
     response.headers.append('WWW-Authorization', f'Bearer error="{exc.code}" error_description="{exc.description}"')
     return response
 
+@app.exception_handler(NotModifiedError)
+async def not_modified_handler(request, exc: NotModifiedError):
+    return Response(status_code=exc.status_code, headers=exc.headers)
+
 @app.exception_handler(HTTPException)
 async def error_handler(request, exc: HTTPException):
     return JSONResponse(exc.detail, status_code=exc.status_code)
@@ -7,6 +7,11 @@ class ApiError(HTTPException):
         self.code = code
         self.description = description
 
+class NotModifiedError(ApiError):
+    def __init__(self, headers: dict[str, str]):
+        super().__init__(304, 'not_modified', 'Not modified')
+        self.headers = headers
+
 class NotImplementedError(ApiError):
     def __init__(self, description = 'Not implemented'):
         super().__init__(501, 'not_implemented', description)
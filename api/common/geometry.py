@@ -6,7 +6,9 @@ from geojson_pydantic import LineString, Point, Polygon
 from pydantic import BaseModel, ConfigDict, Field
 from pydantic_extra_types.color import Color
 
+import numpy as np
 import pyproj
+import shapely
 from shapely.geometry import (
         shape,
         Point as ShapelyPoint,
@@ -19,11 +21,26 @@ from shapely.ops import transform as coord_transform
 CRS_WGS84 = pyproj.CRS('EPSG:4326')
 CRS_SWEDEN = pyproj.CRS('EPSG:3152')
 
-XFRM_GEO_TO_PROJ = pyproj.Transformer.from_crs(CRS_WGS84, CRS_SWEDEN, always_xy=True).transform
-XFRM_PROJ_TO_GEO = pyproj.Transformer.from_crs(CRS_SWEDEN, CRS_WGS84, always_xy=True).transform
+TRANSFORMER_GEO_TO_PROJ = pyproj.Transformer.from_crs(CRS_WGS84, CRS_SWEDEN, always_xy=True)
+TRANSFORMER_PROJ_TO_GEO = pyproj.Transformer.from_crs(CRS_SWEDEN, CRS_WGS84, always_xy=True)
+
+XFRM_GEO_TO_PROJ = TRANSFORMER_GEO_TO_PROJ.transform
+XFRM_PROJ_TO_GEO = TRANSFORMER_PROJ_TO_GEO.transform
 
 ShapelyGeometryT = TypeVar('ShapelyGeometryT', bound=ShapelyBaseGeometry)
 
+def project_shapes(
+        shapes: Iterable[ShapelyGeometryT],
+        transformer: pyproj.Transformer = TRANSFORMER_GEO_TO_PROJ
+        ) -> list[ShapelyGeometryT]:
+    """Transform coordinates of all shapes with a single vectorized transformer call"""
+    def transform_coords(coords: np.ndarray) -> np.ndarray:
+        return np.column_stack(transformer.transform(*coords.T))
+    geoms = np.array(list(shapes), dtype=object)
+    if not len(geoms):
+        return []
+    return list(shapely.transform(geoms, transform_coords, include_z=None))
+
 class BaseStyle(BaseModel):
     model_config = ConfigDict(
             populate_by_name=True
@@ -65,6 +82,14 @@ class GeoObject(BaseModel, Generic[Geom, ShapelyGeometryT, StyleT]):
     def shape_proj(self) -> ShapelyGeometryT:
         return coord_transform(XFRM_GEO_TO_PROJ, self.shape)
 
+    def set_shape_proj(self, shape_proj: ShapelyGeometryT):
+        self.__dict__['shape_proj'] = shape_proj
+
+    def reset_shapes(self):
+        """Drop cached shapes after geometry was modified in place"""
+        self.__dict__.pop('shape', None)
+        self.__dict__.pop('shape_proj', None)
+
     def distance_m(self, other) -> float:
         return self.shape_proj.distance(other.shape_proj)
 
@@ -79,6 +104,12 @@ class GeoObject(BaseModel, Generic[Geom, ShapelyGeometryT, StyleT]):
                 properties=props
                 )
 
+def project_objects(objects: Iterable[GeoObject]):
+    """Fill shape_proj of all objects in one batch instead of lazily one by one"""
+    pending = [o for o in objects if o.geometry and 'shape_proj' not in o.__dict__]
+    for o, shape_proj in zip(pending, project_shapes(o.shape for o in pending)):
+        o.set_shape_proj(shape_proj)
+
 def to_geojson_feature_collection(collection: Iterable[GeoObject[Geom, ShapelyGeometryT, StyleT]], properties_fn: Callable[[GeoObject[Geom, ShapelyGeometryT, StyleT]], Props]) -> FeatureCollection[Feature[Geom, Props]]:
     return FeatureCollection(
             type='FeatureCollection',
@@ -106,7 +137,7 @@ class GeometryPolygon(GeoObject[Polygon, ShapelyPolygon, PolygonStyle]):
     def area(self) -> float:
         if not self.geometry:
             return 0
-        return coord_transform(XFRM_GEO_TO_PROJ, self.shape).area
+        return self.shape_proj.area
 
     def contains(self, other: ShapelyBaseGeometry) -> bool:
         if not self.geometry:
@@ -0,0 +1,70 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+
+from common.errors import NotModifiedError
+
+def _opaque_tag(tag: str) -> str:
+    # If-None-Match uses weak comparison
+    return tag.strip().removeprefix('W/')
+
+def hash_tag(values: Iterable[str]) -> str:
+    """Short hash of whatever else than revisions a response depends on"""
+    return hashlib.sha1(','.join(sorted(values)).encode()).hexdigest()[:8]
+
+@dataclass(frozen=True)
+class ResourceVersion:
+    """Validators for a response derived from the revisions it was built from"""
+    last_id: Optional[int] = None
+    last_modified: Optional[datetime] = None
+    tag: Optional[str] = None
+
+    @property
+    def etag(self) -> str:
+        ts = int(self.last_modified.timestamp() * 1000) if self.last_modified else 0
+        suffix = f'-{self.tag}' if self.tag else ''
+        return f'W/"{self.last_id or 0}-{ts}{suffix}"'
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+                'ETag': self.etag,
+                'Cache-Control': 'private, no-cache',
+                # Responses depend on the roles of the client
+                'Vary': 'Authorization',
+                }
+        if self.last_modified:
+            headers['Last-Modified'] = format_datetime(self.last_modified.astimezone(timezone.utc), usegmt=True)
+        return headers
+
+    def is_current(self, request: Request) -> bool:
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            tags = {_opaque_tag(t) for t in if_none_match.split(',')}
+            return '*' in tags or _opaque_tag(self.etag) in tags
+
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since is None or not self.last_modified:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return self.last_modified.replace(microsecond=0) <= since
+
+    def check(self, request: Request, response: Response):
+        """Raise NotModifiedError if client copy is current, otherwise set validators on response"""
+        headers = self.headers()
+        if self.is_current(request):
+            raise NotModifiedError(headers)
+        response.headers.update(headers)
+
+    def apply(self, response: Response) -> Response:
+        """Set validators on a response returned directly by an endpoint"""
+        response.headers.update(self.headers())
+        return response
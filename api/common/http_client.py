@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Optional
+
+import httpx
+
+from common.errors import ExternalError
+from common.log import Log
+
+log = Log.getChild('http')
+
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+HTTP_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=8)
+
+# Attempts after the first one, delay before each is doubled, seconds
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+
+HTTP_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Client shared by everything running in the current event loop, so
+    connections to the same host are reused"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS, follow_redirects=True)
+        _client_loop = loop
+    return _client
+
+async def http_get(
+        url: str,
+        params: Optional[dict[str, Any]] = None,
+        headers: Optional[dict[str, str]] = None
+        ) -> httpx.Response:
+    """GET retried on connection errors, timeouts and transient server errors.
+
+    Error responses raise ExternalError, 304 is returned as is.
+    """
+    delay = HTTP_BACKOFF
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            response = await get_http_client().get(url, params=params, headers=headers)
+            if response.status_code not in HTTP_RETRY_STATUS:
+                break
+            error = f"HTTP {response.status_code}"
+        except httpx.TransportError as e:
+            error = str(e) or type(e).__name__
+
+        if attempt == HTTP_RETRIES:
+            raise ExternalError(f"GET {url} failed: {error}")
+        log.warning(f"GET {url} failed: {error}, retrying in {delay}s")
+        await asyncio.sleep(delay)
+        delay *= 2
+
+    if response.is_error:
+        raise ExternalError(f"GET {url} failed: HTTP {response.status_code}")
+    return response
+
+__all__ = [
+        'get_http_client',
+        'http_get',
+        ]
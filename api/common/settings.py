@@ -15,6 +15,9 @@ class Settings(BaseSettings):
 
     log_level: str = 'INFO'
 
+    # Write revision data to the shared store_payload table instead of inline
+    store_deduplicate_payloads: bool = False
+
     model_config = SettingsConfigDict(
             env_file="../.env",
             extra='ignore'
@@ -1,10 +1,15 @@
+from datetime import datetime
 from math import ceil
 import asyncstdlib as a
-from typing import Annotated, Any
-from fastapi import APIRouter, Depends
+from typing import Annotated, Any, AsyncIterator, Callable, Optional
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
+from common.db_async import get_db_session
 from common.errors import PermissionDeniedError
-from core.dependencies import DataRequestContextDep, ProjectDep, RequiredProjectRole_Any
+from common.http_cache import ResourceVersion, hash_tag
+from core.dependencies import DataRequestContextDep, ProjectDep, ProjectNotModified, RequiredProjectRole_Any
 from core.permission import Role
 from core.store import VersionedCollection
 
@@ -26,16 +31,67 @@ CollectionWritableDep = Annotated[
         Depends(get_collection_if_roles(Role.Editor, Role.Admin, Role.Owner))
         ]
 
+async def get_collection_version(
+        request: Request,
+        response: Response,
+        collection: CollectionReadableDep,
+        context: DataRequestContextDep,
+        ) -> ResourceVersion:
+    last_id, last_modified = await collection.last_change()
+    roles = collection.roles_for(context.client_permissions)
+    version = ResourceVersion(
+            last_id=last_id,
+            last_modified=last_modified,
+            tag=hash_tag(role.value for role in roles)
+            )
+    version.check(request, response)
+    return version
+
+CollectionVersionDep = Annotated[ResourceVersion, Depends(get_collection_version)]
+CollectionNotModified = Depends(get_collection_version)
+
+STREAM_CHUNK_SIZE = 100
+
+async def encode_ndjson(values: AsyncIterator[BaseModel]) -> AsyncIterator[str]:
+    async for value in values:
+        yield value.model_dump_json(by_alias=True) + '\n'
+
+async def encode_geojson_feature_collection(values: AsyncIterator[BaseModel]) -> AsyncIterator[str]:
+    yield '{"type":"FeatureCollection","features":['
+    separator = ''
+    async for value in values:
+        yield separator + value.model_dump_json(by_alias=True)
+        separator = ','
+    yield ']}'
+
+def collection_stream_response(
+        collection: VersionedCollection,
+        values: Callable[[VersionedCollection], AsyncIterator[BaseModel]],
+        encoder: Callable[[AsyncIterator[BaseModel]], AsyncIterator[str]],
+        media_type: str
+        ) -> StreamingResponse:
+    async def generate():
+        # Request-scoped db session is closed before the response body is sent,
+        # so the stream needs a session of its own
+        async with await get_db_session() as db:
+            c = await collection.rebind(db)
+            chunk = []
+            async for s in encoder(values(c)):
+                chunk.append(s)
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    yield ''.join(chunk)
+                    chunk = []
+            if chunk:
+                yield ''.join(chunk)
+    return StreamingResponse(generate(), media_type=media_type)
+
 router = APIRouter()
 
-@router.get("/")
+@router.get("/", dependencies=[ProjectNotModified])
 async def get_collections(project: ProjectDep) -> dict[str, Any]:
-    result = {}
-    for item in (await project.awaitable_attrs.collections).values():
-        result[item.name] = await item.info()
-    return result
+    return await project.get_collections_info()
 
-@router.get("/change_timestamps", dependencies=[RequiredProjectRole_Any])
+@router.get("/change_timestamps", dependencies=[RequiredProjectRole_Any, ProjectNotModified])
 async def get_change_timestamps(project: ProjectDep):
     result = []
     for item in await project.get_all_changes():
@@ -44,15 +100,60 @@ async def get_change_timestamps(project: ProjectDep):
             result.append(ts)
     return {'timestamps': result}
 
-@router.get("/{collection_name}/items")
+@router.get("/{collection_name}/items", dependencies=[CollectionNotModified])
 async def get_collection_items(collection: CollectionReadableDep):
     return await a.list(collection.all_last_values())
 
-@router.get("/{collection_name}/revisions")
-async def get_collection_revisions(collection: CollectionReadableDep):
-    return await collection.all_revisions()
+@router.get("/{collection_name}/items.ndjson")
+async def get_collection_items_ndjson(
+        collection: CollectionReadableDep,
+        version: CollectionVersionDep
+        ):
+    return version.apply(collection_stream_response(
+            collection,
+            lambda c: c.stream_last_values(),
+            encode_ndjson,
+            'application/x-ndjson'))
+
+@router.get("/{collection_name}/items.geojson")
+async def get_collection_items_geojson(
+        collection: CollectionReadableDep,
+        version: CollectionVersionDep
+        ):
+    return version.apply(collection_stream_response(
+            collection,
+            lambda c: c.stream_last_values(),
+            encode_geojson_feature_collection,
+            'application/geo+json'))
+
+@router.get("/{collection_name}/revisions", dependencies=[CollectionNotModified])
+async def get_collection_revisions(
+        collection: CollectionReadableDep,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None
+        ):
+    return await collection.all_revisions(after_id=after_id, limit=limit)
+
+@router.get("/{collection_name}/revisions.ndjson")
+async def get_collection_revisions_ndjson(
+        collection: CollectionReadableDep,
+        version: CollectionVersionDep
+        ):
+    return version.apply(collection_stream_response(
+            collection,
+            lambda c: c.stream_revisions(),
+            encode_ndjson,
+            'application/x-ndjson'))
+
+@router.get("/{collection_name}/changes", dependencies=[CollectionNotModified])
+async def get_collection_changes(
+        collection: CollectionReadableDep,
+        since_id: Optional[int] = None,
+        since: Optional[datetime] = None
+        ):
+    return await collection.changes_since(since_id=since_id, since=since)
 
-@router.get("/{collection_name}/items/{item_id}")
+@router.get("/{collection_name}/items/{item_id}", dependencies=[CollectionNotModified])
 async def get_collection_item(
         collection: CollectionReadableDep,
         item_id: str
@@ -65,7 +166,7 @@ async def get_collection_item(
 #        item_id: str
 #        ):
 
-@router.get("/{collection_name}/items/{item_id}/revisions")
+@router.get("/{collection_name}/items/{item_id}/revisions", dependencies=[CollectionNotModified])
 async def get_collection_item_revisions(
         collection: CollectionReadableDep,
         item_id: str
@@ -12,6 +12,12 @@ class DataRequestContext:
     time_start: Optional[datetime] = None
     time_end: Optional[datetime] = None
     client_permissions: ClientPermissions = Field(default_factory=frozenset)
+    since_id: Optional[int] = None
+    since: Optional[datetime] = None
+
+    @property
+    def is_delta(self) -> bool:
+        return self.since_id is not None or self.since is not None
 
     @cached_property
     def client_project_roles(self) -> frozenset[Role]:
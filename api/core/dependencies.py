@@ -1,11 +1,12 @@
 from datetime import datetime
 from typing import Annotated, Optional
 
-from fastapi import Depends
+from fastapi import Depends, Request, Response
 from sqlalchemy import select
 
 from common.db_async import DBSessionDep
 from common.errors import NotFoundError, PermissionDeniedError
+from common.http_cache import ResourceVersion, hash_tag
 from core.auth import ClientPermissionsDep
 from core.data_request import DataRequestContext
 from core.permission import Role
@@ -33,13 +34,42 @@ async def get_data_request_context(
     project: ProjectDep,
     client_permissions: ClientPermissionsDep,
     time_start: Optional[datetime] = None,
-    time_end: Optional[datetime] = None
+    time_end: Optional[datetime] = None,
+    since_id: Optional[int] = None,
+    since: Optional[datetime] = None
     ):
     return DataRequestContext(
             project=project,
             client_permissions=client_permissions,
             time_start=time_start,
-            time_end=time_end
+            time_end=time_end,
+            since_id=since_id,
+            since=since
             )
 
 DataRequestContextDep = Annotated[DataRequestContext, Depends(get_data_request_context)]
+
+async def get_client_roles_tag(context: DataRequestContext) -> str:
+    """Hash of the roles the client has in the project and its collections"""
+    collections = await context.project.awaitable_attrs.collections
+    return hash_tag([
+        *(f'project:{role.value}' for role in context.client_project_roles),
+        *(f'{c.id}:{role.value}' for c in collections.values() for role in c.roles_for(context.client_permissions)),
+        ])
+
+async def get_project_version(
+        request: Request,
+        response: Response,
+        context: DataRequestContextDep,
+        ) -> ResourceVersion:
+    last_id, last_modified = await context.project.get_last_change(context.time_end)
+    version = ResourceVersion(
+            last_id=last_id,
+            last_modified=last_modified,
+            tag=f'{context.project.config_hash}-{await get_client_roles_tag(context)}'
+            )
+    version.check(request, response)
+    return version
+
+ProjectVersionDep = Annotated[ResourceVersion, Depends(get_project_version)]
+ProjectNotModified = Depends(get_project_version)
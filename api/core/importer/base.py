@@ -1,19 +1,24 @@
 from abc import abstractmethod
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import cached_property
+import hashlib
 import json
 from typing import Generic, Iterable, Literal, Optional, Protocol
 
 from geojson_pydantic.features import Feat
+import httpx
 from pydantic import BaseModel, StrictInt, StrictStr, model_validator
 from pydantic.fields import PrivateAttr
-import requests
+from sqlalchemy import DateTime, ForeignKey, func
+from sqlalchemy.orm import Mapped, mapped_column
 
-from common.db_async import AsyncSession
+from common.db_async import AsyncSession, DBModel
+from common.http_client import http_get
 from common.log import Log
 from common.model_utils import ModelT
 from common.settings import settings
-from core.store import VersionedCollection
+from core.store import ItemUpdate, VersionedCollection
 from core.user import UserInDB
 
 log = Log.getChild("importer")
@@ -27,16 +32,58 @@ class ImportContext:
     user: UserInDB
     project: 'Project'
     loader: LoaderBase
+    # Import even if the source didn't change since the last import
+    force: bool = False
+    importer: Optional['ImporterBase'] = None
+
+class SourceNotModified(Exception):
+    """Source is the same as when it was last imported to the project"""
+
+class LoaderStateInDB(DBModel):
+    """Validators and hash of a loaded file or URL as of the last import by
+    an importer, see ImporterBase.state_key"""
+    __tablename__ = 'loader_state'
+
+    project_id: Mapped[int] = mapped_column(ForeignKey('project.id', ondelete='CASCADE'), primary_key=True)
+    importer: Mapped[str] = mapped_column(primary_key=True, default='')
+    source: Mapped[str] = mapped_column(primary_key=True)
+    etag: Mapped[Optional[str]] = mapped_column()
+    last_modified: Mapped[Optional[str]] = mapped_column()
+    content_hash: Mapped[Optional[str]] = mapped_column()
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self) -> str:
+        return f"<LoaderStateInDB: project {self.project_id} {self.importer} {self.source} {self.content_hash}>"
+
+@dataclass
+class LoadedSource:
+    content: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @cached_property
+    def content_hash(self) -> str:
+        return hashlib.sha256(self.content).hexdigest()
 
 class ImporterBase(BaseModel, Generic[ModelT]):
     loader: Optional[str]
 
+    @property
+    def state_key(self) -> str:
+        """Whether a source changed is tracked separately for each key"""
+        return getattr(self, 'type', self.__class__.__name__)
+
     @abstractmethod
     async def do_import(self, ctx: ImportContext):
         raise NotImplemented
 
 class CollectionImporterBase(ImporterBase[ModelT], Generic[ModelT]):
     collection: str
+
+    @property
+    def state_key(self) -> str:
+        return self.collection
+
     async def get_target_collection(self, ctx: ImportContext, allow_create: bool = False) -> VersionedCollection:
         return await ctx.project.get_versioned_collection(
             self.collection,
@@ -60,7 +107,7 @@ class ItemRevisionProtocol(Protocol[ModelT]):
 
 class ImporterIncremental(CollectionImporterBase, Generic[ModelT]):
     @abstractmethod
-    def get_revisions(self, ctx: ImportContext, time_start: datetime) -> Iterable[ItemRevisionProtocol[ModelT]]:
+    async def get_revisions(self, ctx: ImportContext, time_start: datetime) -> Iterable[ItemRevisionProtocol[ModelT]]:
         raise NotImplemented
 
     async def do_import(self, ctx: ImportContext):
@@ -71,20 +118,20 @@ class ImporterIncremental(CollectionImporterBase, Generic[ModelT]):
         else:
             time_start = datetime.fromtimestamp(0)
 
-        revisions = self.get_revisions(ctx, time_start)
-        n_added = 0
+        revisions = await self.get_revisions(ctx, time_start)
+        updates = []
         for rev in revisions:
             item = rev.item
             item.id = f"_{item.id}"
 
-            await collection.add(ctx.user, item.id, item,
-                                 timestamp=rev.timestamp_utc,
-                                 revision=rev.revision,
-                                 deleted=rev.deleted,
-                                 )
-            n_added += 1
-            log.debug(f"Added new revision {rev.revision} for {rev.item.id} ({rev.item.properties.name})")
-        log.info(f"{ctx.project.name}/{self.collection}: {n_added} revisions added")
+            updates.append(ItemUpdate(item.id, item,
+                                      timestamp=rev.timestamp_utc,
+                                      revision=rev.revision,
+                                      deleted=rev.deleted,
+                                      ))
+            log.debug(f"Adding new revision {rev.revision} for {rev.item.id} ({rev.item.properties.name})")
+        added = await collection.add_many(ctx.user, updates)
+        log.info(f"{ctx.project.name}/{self.collection}: {len(added)} revisions added")
 
 class LoadFromUrlOrFile(LoaderBase):
     type: Literal['url_or_file'] | Literal['power_map_kml'] = 'url_or_file'
@@ -100,20 +147,109 @@ class LoadFromUrlOrFile(LoaderBase):
             raise ValueError("filename is required when offline")
         return self
 
-    def load(self, path: Optional[str] = None, params: Optional[dict[str, str]] = None):
+    # Content loaded by this instance by source
+    _loaded: dict[str, LoadedSource] = PrivateAttr(default_factory=dict)
+    # Sources and validators the server answered 304 Not Modified to
+    _not_modified: set[tuple[str, Optional[str], Optional[str]]] = PrivateAttr(default_factory=set)
+    # Whether the source changed since it was last imported, by importer and source
+    _changed: dict[tuple[str, str], bool] = PrivateAttr(default_factory=dict)
+
+    def source(self, path: Optional[str] = None, params: Optional[dict[str, str]] = None) -> str:
         if self.offline or not self.url:
             if not self.filename:
                 raise RuntimeError("PlacementLoader: missing filename")
             if path or params:
                 raise RuntimeError("Loading with path or params is only possible from URL")
+            return f'file:{self.filename}'
+        return str(httpx.URL(self.url + (path or ""), params=params))
+
+    async def _fetch(
+            self,
+            path: Optional[str],
+            params: Optional[dict[str, str]],
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None
+            ) -> Optional[LoadedSource]:
+        """Content with validators, None if server says it's not modified"""
+        if self.offline or not self.url:
             log.info(f"Loading file {self.filename}")
             with open(f'{settings.data_dir}/{self.filename}', 'rb') as f:
-                return f.read()
-        else:
-            if not path:
-                path = ""
-            log.info(f"Loading URL {self.url+path} with params {params}")
-            return requests.get(self.url+path, params).content
-
-    def load_json(self, path: Optional[str] = None, params: Optional[dict[str, str]] = None):
-        return json.loads(self.load(path, params))
+                return LoadedSource(f.read())
+
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        log.info(f"Loading URL {self.url + (path or '')} with params {params}")
+        response = await http_get(self.url + (path or ""), params, headers)
+        if response.status_code == 304:
+            return None
+        return LoadedSource(
+                response.content,
+                etag=response.headers.get('etag'),
+                last_modified=response.headers.get('last-modified'))
+
+    async def _load(
+            self,
+            source: str,
+            path: Optional[str],
+            params: Optional[dict[str, str]],
+            state: Optional[LoaderStateInDB] = None
+            ) -> Optional[LoadedSource]:
+        """Content of the source, fetched once per loader. None if the server
+        says it's not modified since the validators of state"""
+        loaded = self._loaded.get(source)
+        if loaded:
+            return loaded
+        validators = (state.etag, state.last_modified) if state else (None, None)
+        if (source, *validators) in self._not_modified:
+            return None
+        loaded = await self._fetch(path, params, *validators)
+        if not loaded:
+            self._not_modified.add((source, *validators))
+            return None
+        self._loaded[source] = loaded
+        return loaded
+
+    async def load(
+            self,
+            path: Optional[str] = None,
+            params: Optional[dict[str, str]] = None,
+            ctx: Optional[ImportContext] = None
+            ) -> bytes:
+        """Content of the file or URL, loaded once per loader.
+
+        With an import context of a project, raise SourceNotModified if it's
+        the same as when the importer last imported it there, unless forced.
+        """
+        source = self.source(path, params)
+        if not (ctx and ctx.project):
+            return (await self._load(source, path, params)).content
+
+        importer = ctx.importer.state_key if ctx.importer else ''
+        if (importer, source) not in self._changed:
+            state = await ctx.db.get(LoaderStateInDB, (ctx.project.id, importer, source))
+            if not state:
+                state = LoaderStateInDB(project_id=ctx.project.id, importer=importer, source=source)
+                ctx.db.add(state)
+            loaded = await self._load(source, path, params, None if ctx.force else state)
+            if loaded:
+                changed = ctx.force or loaded.content_hash != state.content_hash
+                state.etag = loaded.etag
+                state.last_modified = loaded.last_modified
+                state.content_hash = loaded.content_hash
+            else:
+                changed = False
+            self._changed[(importer, source)] = changed
+
+        if not self._changed[(importer, source)]:
+            raise SourceNotModified(source)
+        return self._loaded[source].content
+
+    async def load_json(
+            self,
+            path: Optional[str] = None,
+            params: Optional[dict[str, str]] = None,
+            ctx: Optional[ImportContext] = None):
+        return json.loads(await self.load(path, params, ctx))
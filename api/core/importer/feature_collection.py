@@ -1,3 +1,4 @@
+from dataclasses import replace
 from typing import Literal, Mapping, Optional
 
 from geojson_pydantic import Feature
@@ -17,17 +18,19 @@ class AnyProperties(BaseModel):
 AnyFeature = Feature[Geometry, AnyProperties]
 
 class Importer_FeatureCollection(ImporterMatching):
+    ASYNC = True
+
     type: Literal['feature_collection'] = 'feature_collection'
 
     collection: str
     path: Optional[str] = None
 
-    def get_features(self, ctx: ImportContext):
+    async def get_features_async(self, ctx: ImportContext):
         if not isinstance(ctx.loader, LoadFromUrlOrFile):
             raise RuntimeError("Loader is not LoadFromUrlOrFile")
         loader: LoadFromUrlOrFile = ctx.loader
 
-        j = loader.load_json(self.path)
+        j = await loader.load_json(self.path, ctx=ctx)
         for item in j['features']:
             yield AnyFeature.model_validate(item)
 
@@ -45,4 +48,4 @@ class Importer_StaticCollections(ImporterBase):
                     loader=self.loader,
                     collection=collection,
                     path=path)
-            await importer.do_import(ctx)
+            await importer.do_import(replace(ctx, importer=importer))
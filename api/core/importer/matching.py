@@ -1,26 +1,38 @@
 import asyncstdlib as A
-from math import inf
+from collections import defaultdict
 import re
 from typing import AsyncGenerator, ClassVar, Generator, Generic, Iterable, Optional, TypeVar
 
 from geojson_pydantic import Feature
 from geojson_pydantic.features import Feat, Geom, Props
+import numpy as np
 from pydantic import BaseModel, PrivateAttr
-from shapely import distance, equals, intersection
-from shapely.coords import CoordinateSequence
-from shapely.geometry import Polygon, LineString, Point, shape
+import shapely
+from shapely import STRtree, distance, equals
+from shapely.geometry import shape
 from shapely.geometry.base import BaseGeometry
 
 from common.model_utils import ModelT
-from core.importer.base import CollectionImporterBase, ImportContext, log as _log
+from core.importer.base import CollectionImporterBase, ImportContext, SourceNotModified, log as _log
+from core.importer.similarity import is_geometry_similar
+from core.store import ItemUpdate
 
 log = _log.getChild('matching')
 
+ID_NUMBERED = re.compile(r'^(.*)_(\d+)$')
+
+# Search radius to start from when the nearest features are matched already,
+# degrees
+NEAREST_MIN_RADIUS = 1e-6
+
 class FeatureWithShape(Feature[Geom, Props]):
     _shape: BaseGeometry = PrivateAttr()
 
 FeatWithShape = TypeVar('FeatWithShape', bound=FeatureWithShape)
 
+def _shape_of(f: FeatWithShape) -> Optional[BaseGeometry]:
+    return getattr(f, '_shape', None)
+
 def with_shapes(features: Iterable[Feature[Geom, Props]]) -> Generator[FeatureWithShape[Geom, Props]]:
     for f in features:
         new: FeatureWithShape[Geom, Props] = f.model_copy()
@@ -28,14 +40,6 @@ def with_shapes(features: Iterable[Feature[Geom, Props]]) -> Generator[FeatureWi
             new._shape = shape(new.geometry)
         yield new
 
-def count_matching_points(a: CoordinateSequence, b: CoordinateSequence):
-    n = 0
-    for p1 in map(Point, a):
-        for p2 in map(Point, b):
-            if equals(p1, p2):
-                n += 1
-    return n
-
 def count_matching_fields(a: Optional[BaseModel], b: Optional[BaseModel]):
     if not a or not b:
         return 0
@@ -50,57 +54,90 @@ def count_matching_fields(a: Optional[BaseModel], b: Optional[BaseModel]):
         log.debug(f"Found {n} matching fields")
     return n
 
-def find_exact_matching_feature(feature: FeatWithShape, features: Iterable[FeatWithShape]):
-    for f in features:
-        if f.id and feature.id and f.id == feature.id:
-            return f
-
-        if equals(f._shape, feature._shape):
-            return f
-    return None
-
-def find_nearest_feature(feature: FeatWithShape, features: Iterable[FeatWithShape]):
-    best = None
-    best_distance = inf
-    for f in features:
-        d = distance(f._shape.centroid, feature._shape.centroid)
-        if d < best_distance:
-            best_distance = d
-            best = f
-
-    return best
-
-def is_geometry_similar(a: FeatWithShape, b: FeatWithShape):
-    if isinstance(a._shape, Polygon) and isinstance(b._shape, Polygon):
-        #debug(a, b)
-        mp = count_matching_points(a._shape.exterior.coords, b._shape.exterior.coords)
-        if mp > 0:
-            log.debug(f"Similar geometry: Polygons has {mp} matching points")
-            return True
-
-        # idk let's try comparing area of each polygon with area of their intersection?
-        aa = a._shape.area
-        ab = a._shape.area
-        ai = intersection(a._shape, b._shape).area
-        log.debug(f"Polygon areas {aa=} {ab=} {ai=}")
-        result = ai > 0 and abs(aa - ai) < 0.1*aa and abs(ab - ai) < 0.1*ab
-        if result:
-            log.debug(f"Similar geometry: polygon intersection")
-            return True
-
-    elif isinstance(a._shape, LineString) and isinstance(b._shape, LineString):
-        mp = count_matching_points(a._shape.coords, b._shape.coords)
-        if mp > 0:
-            log.debug(f"Similar geometry: LineStrings has {mp} matching points")
-            return True
-
-    elif isinstance(a._shape, Point):
-        result = equals(a._shape, b._shape)
-        if result:
-            log.debug(f"Similar geometry: Points are the same")
-            return True
-
-    return False
+class FeatureIds:
+    """Largest number n of ids in the form <prefix>_<n> for each prefix"""
+    def __init__(self, ids: Iterable[str]):
+        self._max_n: dict[str, int] = {}
+        for v in ids:
+            m = ID_NUMBERED.match(v)
+            if m:
+                self._add(m[1], int(m[2]))
+
+    def _add(self, prefix: str, n: int):
+        if n > self._max_n.get(prefix, 0):
+            self._max_n[prefix] = n
+
+    def generate(self, prefix: str) -> str:
+        """Next id for the prefix, taken from now on"""
+        n = self._max_n.get(prefix, 0) + 1
+        self._max_n[prefix] = n
+        return f"{prefix}_{n}"
+
+class KnownFeatures(Generic[FeatWithShape]):
+    """Features already in the collection, indexed for matching new ones.
+
+    Matched features are only marked as such, lookups return the first
+    unmatched one in the original order, the same a linear scan would find.
+    """
+    def __init__(self, features: list[FeatWithShape]):
+        self.features = features
+        self.matched = np.zeros(len(features), dtype=bool)
+        shapes = [_shape_of(f) for f in features]
+        self._has_shape = np.array([s is not None for s in shapes], dtype=bool)
+
+        self._by_id: dict[str, list[int]] = defaultdict(list)
+        for i, f in enumerate(features):
+            if f.id:
+                self._by_id[f.id].append(i)
+
+        # Equal geometries may have different vertices, but not bounds
+        self._by_bounds: dict[tuple[float, ...], list[int]] = defaultdict(list)
+        for i in np.flatnonzero(self._has_shape).tolist():
+            self._by_bounds[shapes[i].bounds].append(i)
+
+        self._centroids = shapely.centroid(np.array(shapes, dtype=object))
+        self._located = _is_located(self._centroids)
+        self._tree = STRtree(self._centroids)
+
+    def take(self, i: int) -> FeatWithShape:
+        self.matched[i] = True
+        return self.features[i]
+
+    def unmatched(self) -> list[FeatWithShape]:
+        return [self.features[i] for i in np.flatnonzero(~self.matched).tolist()]
+
+    def find_exact(self, feature: FeatWithShape) -> Optional[int]:
+        """Feature with the same id or equal geometry"""
+        found = [i for i in self._by_id.get(feature.id, ()) if not self.matched[i]] if feature.id else []
+        shape = _shape_of(feature)
+        if shape is not None:
+            found += [
+                    i for i in self._by_bounds.get(shape.bounds, ())
+                    if not self.matched[i] and equals(self.features[i]._shape, shape)]
+        return min(found, default=None)
+
+    def find_nearest(self, feature: FeatWithShape) -> Optional[int]:
+        """Feature with the nearest centroid, among ones with a location"""
+        shape = _shape_of(feature)
+        if shape is None or not (self._located & ~self.matched).any():
+            return None
+        point = shape.centroid
+        if not _is_located(np.array([point], dtype=object))[0]:
+            return None
+        found, distances = self._tree.query_nearest(point, all_matches=True, return_distance=True)
+        radius = max(distances.max(), NEAREST_MIN_RADIUS)
+        while True:
+            found = found[self._located[found] & ~self.matched[found]]
+            if len(found):
+                return int(found[np.lexsort((found, distance(self._centroids[found], point)))[0]])
+            # Nearest ones are matched already, look further
+            radius *= 2
+            found = self._tree.query(point, predicate='dwithin', distance=radius)
+
+def _is_located(points: np.ndarray) -> np.ndarray:
+    """Whether centroids are points with finite coordinates, empty shapes
+    have empty ones, which no distance query finds"""
+    return np.isfinite(shapely.bounds(points)).all(axis=1)
 
 def feature_changed(old: FeatWithShape, new: FeatWithShape):
     return not ((old._shape == new._shape) and (old.properties == new.properties))
@@ -121,82 +158,89 @@ class ImporterMatching(CollectionImporterBase[Feat], Generic[Feat]):
         return f.properties.name
 
     @classmethod
-    def feature_generate_id(cls, f: Feat, all_ids: Iterable[str]):
+    def feature_id_prefix(cls, f: Feat) -> str:
         prefix = re.sub(r'[^a-zA-Z0-9_]', '_', cls.feature_prop_for_id(f)).strip('_ ')
         if not prefix or (prefix and prefix[0].isdigit()):
             prefix = '_' + prefix
+        return prefix
 
-        max_n = 0
-        for v in all_ids:
-            m = re.match(f'^{prefix}_(\\d+)$', v)
-            if m:
-                n = int(m[1])
-                if n > max_n:
-                    max_n = n
-        return f"{prefix}_{max_n+1}"
+    @classmethod
+    def feature_generate_id(cls, f: Feat, ids: FeatureIds) -> str:
+        return ids.generate(cls.feature_id_prefix(f))
 
     async def do_import(self, ctx: ImportContext):
+        try:
+            if self.ASYNC:
+                features = await A.list(self.get_features_async(ctx))
+            else:
+                features = list(self.get_features(ctx))
+        except SourceNotModified as e:
+            log.info(f"{ctx.project.name}/{self.collection}: {e} not modified since last import, skipping")
+            return
+
         collection = await self.get_target_collection(ctx, allow_create=True)
         features_known = list(with_shapes(await A.list(collection.all_last_values())))
-        if self.ASYNC:
-            features = await A.list(self.get_features_async(ctx))
-        else:
-            features = self.get_features(ctx)
         features_new = list(with_shapes(features))
 
+        known = KnownFeatures(features_known)
+        new_matched = np.zeros(len(features_new), dtype=bool)
         pairs = []
-        all_ids = [str(item.id) for item in features_known if item.id]
+        ids = FeatureIds(str(item.id) for item in features_known if item.id)
 
-        def match_pair(known, new):
-            pairs.append((known, new))
-            features_known.remove(known)
-            features_new.remove(new)
+        def match_pair(i, j):
+            known_item, new = known.take(i), features_new[j]
+            new_matched[j] = True
+            pairs.append((known_item, new))
             if not new.id:
-                if known.id:
-                    new.id = known.id
+                if known_item.id:
+                    new.id = known_item.id
                 else:
-                    log.warning(f"Existing feature {known.properties.name} doesn't have id (this must never happen)")
-
-        for item in features_new.copy():
-            found = find_exact_matching_feature(item, features_known)
-            if found:
-                log.debug(f"Exact match: {item.properties.name} is {found.id}")
-                match_pair(found, item)
-
-        for item in features_new.copy():
-            found = find_nearest_feature(item, features_known)
-            if not found:
+                    log.warning(f"Existing feature {known_item.properties.name} doesn't have id (this must never happen)")
+
+        for j, item in enumerate(features_new):
+            i = known.find_exact(item)
+            if i is not None:
+                log.debug(f"Exact match: {item.properties.name} is {known.features[i].id}")
+                match_pair(i, j)
+
+        for j in np.flatnonzero(~new_matched).tolist():
+            item = features_new[j]
+            i = known.find_nearest(item)
+            if i is None:
                 continue
+            found = known.features[i]
             if found.properties.name == item.properties.name:
                 log.warning(f"Name match: {item.properties.name} is {found.id}")
-                if is_geometry_similar(found, item) or count_matching_fields(found.properties, item.properties) > 0:
-                    match_pair(found, item)
+                if is_geometry_similar(found._shape, item._shape) or count_matching_fields(found.properties, item.properties) > 0:
+                    match_pair(i, j)
 
-        for item in features_new:
+        for j in np.flatnonzero(~new_matched).tolist():
+            item = features_new[j]
             if not item.id:
-                item.id = self.feature_generate_id(item, all_ids)
-                all_ids.append(item.id)
+                item.id = self.feature_generate_id(item, ids)
 
             pairs.append((None, item))
 
-        for item in features_known:
+        for item in known.unmatched():
             pairs.append((item, None))
 
         n_added, n_deleted, n_changed = 0, 0, 0
+        updates = []
         for known, new in pairs:
             if not new:
                 log.debug(f"Deleted: {known.id}")
-                await collection.add(ctx.user, known.id, None)
+                updates.append(ItemUpdate(known.id, None))
                 n_deleted += 1
             elif not known:
                 log.debug(f"Added {new.id} ({new.properties.name})")
-                await collection.add(ctx.user, new.id, new)
+                updates.append(ItemUpdate(new.id, new))
                 n_added += 1
             elif feature_changed(known, new):
                 #debug(known, new)
                 log.debug(f"Updated {new.id} ({new.properties.name})")
-                await collection.add(ctx.user, new.id, new)
+                updates.append(ItemUpdate(new.id, new))
                 n_changed += 1
+        await collection.add_many(ctx.user, updates)
 
         log.info(f"{ctx.project.name}/{self.collection}: {n_added} added, {n_deleted} deleted, {n_changed} changed")
 
@@ -0,0 +1,70 @@
+import numpy as np
+import shapely
+from shapely import equals, intersection, make_valid
+from shapely.errors import GEOSException
+from shapely.geometry import LineString, Point, Polygon
+from shapely.geometry.base import BaseGeometry
+
+from core.importer.base import log as _log
+
+log = _log.getChild('similarity')
+
+# Decimal places coordinates are compared at, 1e-7 degrees is about 1cm
+COORD_PRECISION = 7
+
+# Largest part of either polygon allowed outside of their intersection
+AREA_TOLERANCE = 0.1
+
+def coords_set(shape: BaseGeometry) -> set[tuple[float, float]]:
+    return set(map(tuple, np.round(shapely.get_coordinates(shape), COORD_PRECISION).tolist()))
+
+def count_matching_points(a: BaseGeometry, b: BaseGeometry) -> int:
+    """Number of distinct vertices a and b have in common"""
+    return len(coords_set(a) & coords_set(b))
+
+def _bounds_intersection_area(a: BaseGeometry, b: BaseGeometry) -> float:
+    ax0, ay0, ax1, ay1 = a.bounds
+    bx0, by0, bx1, by1 = b.bounds
+    return max(min(ax1, bx1) - max(ax0, bx0), 0) * max(min(ay1, by1) - max(ay0, by0), 0)
+
+def is_area_similar(a: Polygon, b: Polygon) -> bool:
+    """Whether the intersection covers all but AREA_TOLERANCE of each polygon.
+
+    Intersection can't be larger than the smaller polygon or the intersection
+    of bounding boxes, so most pairs are ruled out before computing it.
+    """
+    aa, ab = a.area, b.area
+    limit = (1 - AREA_TOLERANCE) * max(aa, ab)
+    if min(aa, ab) <= limit or _bounds_intersection_area(a, b) <= limit:
+        return False
+    try:
+        ai = intersection(a, b).area
+    except GEOSException:
+        # Self-intersecting polygons drawn by hand
+        ai = intersection(make_valid(a), make_valid(b)).area
+    log.debug(f"Polygon areas {aa=} {ab=} {ai=}")
+    return ai > 0 and abs(aa - ai) < AREA_TOLERANCE * aa and abs(ab - ai) < AREA_TOLERANCE * ab
+
+def is_geometry_similar(a: BaseGeometry, b: BaseGeometry) -> bool:
+    if isinstance(a, Polygon) and isinstance(b, Polygon):
+        mp = count_matching_points(a.exterior, b.exterior)
+        if mp > 0:
+            log.debug(f"Similar geometry: Polygons has {mp} matching points")
+            return True
+
+        if is_area_similar(a, b):
+            log.debug("Similar geometry: polygon intersection")
+            return True
+
+    elif isinstance(a, LineString) and isinstance(b, LineString):
+        mp = count_matching_points(a, b)
+        if mp > 0:
+            log.debug(f"Similar geometry: LineStrings has {mp} matching points")
+            return True
+
+    elif isinstance(a, Point):
+        if equals(a, b):
+            log.debug("Similar geometry: Points are the same")
+            return True
+
+    return False
@@ -44,6 +44,10 @@ class MapLayerData_Features(DataViewResultBase, Generic[_Feat]):
     timestamp: Optional[datetime]
     options: Optional[MapLayerOptions] = None
     features: list[_Feat]
+    last_revision_id: Optional[int] = None
+    # Only set for delta responses (since_id/since in the request), features
+    # are then only the ones changed since
+    deleted: Optional[list[str]] = None
 
 class MapLayer_Features(
         DataViewBase[
@@ -57,7 +61,15 @@ class MapLayer_Features(
     async def get(self, context: DataRequestContext):
         store_collection: StoreCollection = await context.project.get_store_collection(self.config.collection)
         collection = store_collection.instantiate(context)
-        features = await a.list(collection.all_last_values())
+        deleted = None
+        if context.is_delta:
+            delta = await collection.changes_since(since_id=context.since_id, since=context.since)
+            features = delta.changed
+            deleted = delta.deleted
+            last_revision_id = delta.last_id
+        else:
+            features = await a.list(collection.all_last_values())
+            last_revision_id = await collection.last_revision_id()
         if self.config.transform:
             if not self.TRANSFORMS:
                 raise InternalError(f'MapLayer_Features: missing transforms')
@@ -75,5 +87,7 @@ class MapLayer_Features(
             type='features',
             timestamp=await collection.last_timestamp(),
             features=features,
-            options=options
+            options=options,
+            last_revision_id=last_revision_id,
+            deleted=deleted
         )
@@ -1,4 +1,5 @@
 from datetime import datetime, timezone
+import hashlib
 from math import ceil
 from typing import Any, Iterable, Mapping, Optional, Self
 
@@ -22,7 +23,7 @@ from core.permission import ClientPermissions, Permission, PermissionInDB, Role,
 from core.log import log
 from core.project_config import ProjectConfig, merge_config
 from core.map import AnyMapLayerData, MapViewData
-from core.store import StoreCollection, StoreItemRevision, VersionedCollection
+from core.store import CollectionInfo, StoreCollection, StoreItemRevision, VersionedCollection, get_collections_info
 
 class View(BaseModel):
     name: str
@@ -47,6 +48,10 @@ class Project(DBModel, AsyncAttrs, AsyncSessionMixin):
     def config(self):
         return self.data
 
+    @property
+    def config_hash(self) -> str:
+        return hashlib.sha1(self.data.model_dump_json().encode()).hexdigest()[:8]
+
     def roles_for(self, client_permissions: ClientPermissions):
         if self.config.public:
             return {*get_roles(client_permissions, 'project', self.id), Role.Guest}
@@ -84,6 +89,11 @@ class Project(DBModel, AsyncAttrs, AsyncSessionMixin):
                 allow_create=allow_create
                 )).instantiate(context)
 
+    async def get_collections_info(self) -> dict[str, CollectionInfo]:
+        collections = await self.awaitable_attrs.collections
+        infos = await get_collections_info(self._db(), [c.id for c in collections.values()])
+        return {name: infos[c.id] for name, c in collections.items()}
+
     async def get_all_permissions(self):
         db = self._db()
         subq = (union(
@@ -145,6 +155,28 @@ class Project(DBModel, AsyncAttrs, AsyncSessionMixin):
                 .where(StoreItemRevision.timestamp < (time_end or datetime.now(timezone.utc)))
                 )
 
+    async def get_last_change(self, time_end: Optional[datetime] = None) -> tuple[Optional[int], Optional[datetime]]:
+        """Last revision id and timestamp over all project collections"""
+        db = self._db()
+        if not time_end:
+            last_id, last_timestamp = (await db.execute(
+                    select(func.max(StoreCollection.last_revision_id), func.max(StoreCollection.last_timestamp))
+                    .where(StoreCollection.project_id == self.id)
+                    )).one()
+            return last_id, last_timestamp
+
+        subquery = (
+                select(StoreCollection.id)
+                .where(StoreCollection.project_id == self.id)
+                .subquery()
+                )
+        last_id, last_timestamp = (await db.execute(
+                select(func.max(StoreItemRevision.id), func.max(StoreItemRevision.timestamp))
+                .join(subquery, StoreItemRevision.collection_id == subquery.c.id)
+                .where(StoreItemRevision.timestamp <= time_end)
+                )).one()
+        return last_id, last_timestamp
+
     async def get_change_timestamps(self):
         tss: list[float] = []
         for item in await self.get_all_changes():
@@ -228,21 +260,25 @@ class Project(DBModel, AsyncAttrs, AsyncSessionMixin):
         self.data = config
         db.add(self)
 
-    async def update_data(self, user: Optional[UserInDB] = None, loader_name: Optional[str] = None):
+    async def update_data(self, user: Optional[UserInDB] = None, loader_name: Optional[str] = None, force: bool = False):
         if loader_name:
             importers = [it for it in self.config.external.importers if it.loader == loader_name]
         else:
             importers = self.config.external.importers
+        # Loaders keep what they loaded, fresh ones load everything once per update
+        loaders = {name: loader.model_copy(deep=True) for name, loader in self.config.external.loaders.items()}
         for importer in importers:
             loader = None
             if importer.loader:
-                loader = self.config.external.loaders.get(importer.loader)
+                loader = loaders.get(importer.loader)
 
             ctx = ImportContext(
                     db=self._db(),
                     user=user,
                     project=self,
-                    loader=loader
+                    loader=loader,
+                    force=force,
+                    importer=importer
                     )
             await importer.do_import(ctx)
 
@@ -2,7 +2,7 @@ from typing import Annotated
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 
-from core.dependencies import DataRequestContextDep, ProjectDep, RequiredProjectRole_Any
+from core.dependencies import DataRequestContextDep, ProjectDep, ProjectNotModified, RequiredProjectRole_Any
 from core.data_view import DataViewBase
 
 router = APIRouter()
@@ -21,14 +21,14 @@ async def get_view_element(
 
 DataViewElementDep = Annotated[DataViewBase, Depends(get_view_element)]
 
-@router.get("/", dependencies=[RequiredProjectRole_Any])
+@router.get("/", dependencies=[RequiredProjectRole_Any, ProjectNotModified])
 async def get_default_view(
         project: ProjectDep,
         context: DataRequestContextDep,
         ):
     return await project.get_view('default', context)
 
-@router.get("/info", dependencies=[RequiredProjectRole_Any])
+@router.get("/info", dependencies=[RequiredProjectRole_Any, ProjectNotModified])
 async def get_info(ctx: DataRequestContextDep):
     return ProjectInfo(
             name=ctx.project.name,
@@ -36,7 +36,7 @@ async def get_info(ctx: DataRequestContextDep):
             timestamps=[t.timestamp() for t in await ctx.project.get_change_timestamps()]
             )
 
-@router.get("/v/{view_name}", dependencies=[RequiredProjectRole_Any])
+@router.get("/v/{view_name}", dependencies=[RequiredProjectRole_Any, ProjectNotModified])
 async def get_project_view(
         project: ProjectDep,
         view_name: str,
@@ -44,7 +44,7 @@ async def get_project_view(
         ):
     return await project.get_view(view_name, context)
 
-@router.get("/v/{view_name}/{element_alias}", dependencies=[RequiredProjectRole_Any])
+@router.get("/v/{view_name}/{element_alias}", dependencies=[RequiredProjectRole_Any, ProjectNotModified])
 async def get_project_view_element(
         element: DataViewElementDep,
         context: DataRequestContextDep,
@@ -7,13 +7,23 @@ import typer
 from rich import print
 
 from common.cli import AsyncTyper
-from common.db_async import get_db_session
+from common.db_async import get_db_session, sessionmanager
 from core.dependencies import get_project
 from core.log import log
 from core.permission import grant_permission
 from core.project import Project, create_project
 from core.project_config import ProjectConfig
-from core.store import StoreCollection, StoreItemRevision
+from core.store import (
+        StoreCheckpoint,
+        StoreCollection,
+        StoreItemHead,
+        StoreItemRevision,
+        compact_payloads,
+        delete_orphan_payloads,
+        drop_checkpoints,
+        rebuild_item_heads,
+        upgrade_schema,
+        )
 from core.user import get_user_db
 from project_configs.bl import get_default_project_config
 
@@ -74,11 +84,15 @@ async def delete(name: str):
         await db.commit()
 
 @project.command()
-async def data_update(name: str, loader: Optional[str] = typer.Option(None), commit: bool = typer.Option(False)):
+async def data_update(
+        name: str,
+        loader: Optional[str] = typer.Option(None),
+        commit: bool = typer.Option(False),
+        force: Annotated[bool, typer.Option(help="Import sources not modified since the last import too")] = False):
     async with await get_db_session() as db:
         user = await get_user_db(db, 'admin')
         project = await get_project(db, name)
-        await project.update_data(user=user, loader_name=loader)
+        await project.update_data(user=user, loader_name=loader, force=force)
         if commit:
             log.info("Saving updates to the database")
             await db.commit()
@@ -127,15 +141,19 @@ async def set_public(project_name: str, public: bool):
         print("Updated config: ", project.config)
         await db.commit()
 
+@project.command()
+async def schema_upgrade():
+    async with sessionmanager.connect() as conn:
+        await upgrade_schema(conn)
+    log.info("Database schema is up to date")
+
 @project.command()
 async def data_list(project_name: str):
     async with await get_db_session() as db:
         project = await get_project(db, project_name)
         print(f"Project {project.name} collections:")
-        colls = await project.awaitable_attrs.collections
-        for name, c in colls.items():
-            info = await c.info()
-            print(f"    {name}: item_type={info.item_type}, {info.num_items} items, {info.num_revisions} revisions")
+        for name, info in (await project.get_collections_info()).items():
+            print(f"    {name}: item_type={info.item_type}, {info.num_items} items ({info.num_deleted} deleted), {info.num_revisions} revisions, {info.data_size:,} bytes, {info.first_timestamp} - {info.last_timestamp}")
 
 @project.command()
 async def data_delete(project_name: str, collection: str):
@@ -149,6 +167,30 @@ async def data_delete(project_name: str, collection: str):
         info = await c.info()
         print(f"Found collection {project.name}/{collection}\nitem_type={info.item_type}, {info.num_items} items, {info.num_revisions} revisions")
         typer.confirm(f"This will IRREVERSIBLY delete all data in {project.name}/{collection}. Proceed?", abort=True)
+        await db.execute(sql_delete(StoreCheckpoint).where(StoreCheckpoint.collection_id == c.id))
+        await db.execute(sql_delete(StoreItemHead).where(StoreItemHead.collection_id == c.id))
         await db.execute(sql_delete(StoreItemRevision).where(StoreItemRevision.collection_id == c.id))
         await db.execute(sql_delete(StoreCollection).where(StoreCollection.id == c.id))
+        await delete_orphan_payloads(db)
+        await db.commit()
+
+@project.command()
+async def data_reindex(project_name: str):
+    async with await get_db_session() as db:
+        project = await get_project(db, project_name)
+        colls = await project.awaitable_attrs.collections
+        for name, c in colls.items():
+            await rebuild_item_heads(db, c.id)
+            await drop_checkpoints(db, c.id)
+            log.info(f"{project.name}/{name}: Rebuilt item heads, dropped checkpoints")
+        await db.commit()
+
+@project.command()
+async def data_compact(project_name: str):
+    async with await get_db_session() as db:
+        project = await get_project(db, project_name)
+        colls = await project.awaitable_attrs.collections
+        for name, c in colls.items():
+            n = await compact_payloads(db, c.id)
+            log.info(f"{project.name}/{name}: Moved data of {n} revisions to payload store")
         await db.commit()
@@ -1,29 +1,71 @@
 from abc import ABC
-from datetime import datetime, timezone
+from dataclasses import dataclass
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
 from typing import Any, AsyncGenerator, ClassVar, Dict, Generic, Iterable, List, Optional, Self, TypeVar
+from cachetools import TTLCache
 from pydantic import BaseModel, TypeAdapter
-from sqlalchemy import ForeignKey, Index, delete, func, select
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncSession, async_object_session
+from sqlalchemy import ForeignKey, Index, Integer, LargeBinary, any_, bindparam, delete, exists, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncConnection, AsyncSession, async_object_session
 from sqlalchemy.orm import Mapped, attribute_keyed_dict, mapped_column, relationship
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.types import DateTime
 
 from common.db import DBModel
 from common.errors import InternalError, NotFoundError
 from common.model_utils import ModelT
 from common.log import Log
+from common.settings import settings
 from core.data_request import DataRequestContext
 from core.permission import ClientPermissions, Permission, PermissionInDB, Role, get_roles
 from core.user import User, UserInDB
 
 log = Log.getChild('store')
 
+STREAM_BATCH_SIZE = 500
+
+CHECKPOINT_INTERVAL_REVISIONS = 1000
+CHECKPOINT_INTERVAL_TIME = timedelta(minutes=60)
+
+# Columns added to tables that existed before, create_all doesn't alter
+# existing tables
+SCHEMA_UPGRADES = [
+    "ALTER TABLE store_item_revision ADD COLUMN IF NOT EXISTS payload_hash bytea REFERENCES store_payload(hash)",
+    "ALTER TABLE store_collection ADD COLUMN IF NOT EXISTS last_revision_id integer",
+    "ALTER TABLE store_collection ADD COLUMN IF NOT EXISTS last_timestamp timestamp with time zone",
+    """UPDATE store_collection SET (last_revision_id, last_timestamp) = (
+        SELECT max(r.id), max(r.timestamp) FROM store_item_revision r
+        WHERE r.collection_id = store_collection.id)
+    WHERE last_revision_id IS NULL""",
+    "ALTER TABLE loader_state ADD COLUMN IF NOT EXISTS importer varchar NOT NULL DEFAULT ''",
+    "ALTER TABLE loader_state DROP CONSTRAINT IF EXISTS loader_state_pkey, ADD PRIMARY KEY (project_id, importer, source)",
+    "ALTER TABLE power_grid_snapshot ADD COLUMN IF NOT EXISTS version varchar NOT NULL DEFAULT ''",
+    "ALTER TABLE store_collection ADD COLUMN IF NOT EXISTS revisions_since_checkpoint integer NOT NULL DEFAULT 0",
+    "ALTER TABLE store_collection ADD COLUMN IF NOT EXISTS checkpoint_timestamp timestamp with time zone",
+    """UPDATE store_collection SET
+        checkpoint_timestamp = (
+            SELECT max(c.timestamp) FROM store_checkpoint c
+            WHERE c.collection_id = store_collection.id),
+        revisions_since_checkpoint = (
+            SELECT count(*) FROM store_item_revision r
+            WHERE r.collection_id = store_collection.id AND r.id > coalesce((
+                SELECT max(c.last_revision_id) FROM store_checkpoint c
+                WHERE c.collection_id = store_collection.id), 0))
+    WHERE revisions_since_checkpoint = 0""",
+    ]
+
 class CollectionInfo(BaseModel):
     id: int
     name: str
     item_type: str
     num_items: int
     num_revisions: int
+    num_deleted: int = 0
+    first_timestamp: Optional[datetime] = None
+    last_timestamp: Optional[datetime] = None
+    data_size: int = 0
 
 class ItemRevisionInfo(BaseModel, Generic[ModelT]):
     revision: int
@@ -32,9 +74,40 @@ class ItemRevisionInfo(BaseModel, Generic[ModelT]):
     deleted: bool
     data: Optional[ModelT]
 
+class ItemRevisionRecord(ItemRevisionInfo[ModelT], Generic[ModelT]):
+    item_id: str
+
+@dataclass
+class ItemUpdate(Generic[ModelT]):
+    item_id: str
+    data: Optional[ModelT]
+    timestamp: Optional[datetime] = None
+    revision: Optional[int] = None
+    deleted: bool = False
+
+class CollectionDelta(BaseModel, Generic[ModelT]):
+    since_id: Optional[int] = None
+    since: Optional[datetime] = None
+    last_id: Optional[int] = None
+    changed: list[ModelT]
+    deleted: list[str]
+
 class CollectionWithRevisions(CollectionInfo, Generic[ModelT]):
     items: dict[str, list[ItemRevisionInfo[ModelT]]]
+    last_id: Optional[int] = None
+
+
+class StorePayload(DBModel):
+    """Revision data shared by all revisions with identical content"""
+    __tablename__ = 'store_payload'
 
+    hash: Mapped[bytes] = mapped_column(LargeBinary, primary_key=True)
+    data: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)
+
+def payload_hash(data: dict[str, Any]) -> bytes:
+    return hashlib.sha256(
+            json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+            ).digest()
 
 class StoreItemRevision(DBModel, AsyncAttrs):
     __tablename__ = 'store_item_revision'
@@ -47,8 +120,13 @@ class StoreItemRevision(DBModel, AsyncAttrs):
     timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     deleted: Mapped[bool] = mapped_column(default=False)
 
-    data: Mapped[dict[str, Any]] = mapped_column(JSONB)
+    # Either inline data or a reference to deduplicated StorePayload, use data
+    # property to read whichever is set. Older rows may hold JSON null instead
+    # of SQL NULL for deleted items.
+    _data: Mapped[Optional[dict[str, Any]]] = mapped_column('data', JSONB(none_as_null=True))
+    payload_hash: Mapped[Optional[bytes]] = mapped_column(ForeignKey('store_payload.hash'))
 
+    payload: Mapped[Optional[StorePayload]] = relationship(lazy='joined')
     user: Mapped[UserInDB] = relationship()
     collection: Mapped['StoreCollection'] = relationship(
             back_populates='revisions'
@@ -58,6 +136,12 @@ class StoreItemRevision(DBModel, AsyncAttrs):
 #            'polymorphic_on': 'entity_type',
 #            }
 
+    @property
+    def data(self) -> Optional[dict[str, Any]]:
+        if self._data is not None:
+            return self._data
+        return self.payload and self.payload.data
+
     def __repr__(self) -> str:
         return f"<StoreItemRevision[{self.id}]: {self.collection.name}/{self.item_id} v{self.revision}>"
 
@@ -69,6 +153,15 @@ class StoreCollection(DBModel, AsyncAttrs):
     name: Mapped[str] = mapped_column(nullable=False)
     item_type: Mapped[str] = mapped_column(nullable=False)
 
+    # Id and largest timestamp of revisions, maintained by
+    # VersionedCollection.add_many so they are cheap to check on every request
+    last_revision_id: Mapped[Optional[int]] = mapped_column()
+    last_timestamp: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # Revisions added since the last checkpoint and its time, to tell when
+    # the next one is due without querying on every write
+    revisions_since_checkpoint: Mapped[int] = mapped_column(default=0, server_default='0', nullable=False)
+    checkpoint_timestamp: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
     project: Mapped['Project'] = relationship(
             back_populates='collections'
             )
@@ -88,13 +181,10 @@ class StoreCollection(DBModel, AsyncAttrs):
         return get_roles(client_permissions, 'collection', str(self.id))
 
     async def info(self) -> CollectionInfo:
-        return CollectionInfo(
-                id=self.id,
-                name=self.name,
-                item_type=self.item_type,
-                num_items=len(await self.awaitable_attrs.items),
-                num_revisions=len(await self.awaitable_attrs.revisions)
-                )
+        db = async_object_session(self)
+        if not db:
+            raise InternalError("db session not found")
+        return (await get_collections_info(db, [self.id]))[self.id]
 
     def instantiate(self, context: Optional[DataRequestContext] = None):
         return VersionedCollection.instantiate(self, context)
@@ -105,10 +195,240 @@ Index('idx_collection_item_revision',
       StoreItemRevision.revision,
       unique=True)
 
+class StoreItemHead(DBModel):
+    """Current (latest) revision of every item in a collection.
+
+    Maintained by VersionedCollection.add, so reading the latest state of a
+    collection doesn't need to scan its whole revision history. Items whose
+    latest revision has no data count as deleted.
+    """
+    __tablename__ = 'store_item_head'
+
+    collection_id: Mapped[int] = mapped_column(ForeignKey('store_collection.id'), primary_key=True)
+    item_id: Mapped[str] = mapped_column(primary_key=True)
+    revision: Mapped[int] = mapped_column(nullable=False)
+    deleted: Mapped[bool] = mapped_column(default=False, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<StoreItemHead: {self.collection_id}/{self.item_id} v{self.revision}>"
+
+def _revision_deleted():
+    """Whether a revision leaves its item deleted, same as StoreItemHead.deleted"""
+    return StoreItemRevision.deleted | (
+            (func.coalesce(func.jsonb_typeof(StoreItemRevision._data), 'null') == 'null') &
+            StoreItemRevision.payload_hash.is_(None))
+
+async def rebuild_item_heads(db: AsyncSession | AsyncConnection, collection_id: int):
+    """Recreate store_item_head rows of a collection from its revision history"""
+    await db.execute(delete(StoreItemHead).where(StoreItemHead.collection_id == collection_id))
+    last = (
+            select(
+                StoreItemRevision.collection_id,
+                StoreItemRevision.item_id,
+                func.max(StoreItemRevision.revision).label('revision'))
+            .where(StoreItemRevision.collection_id == collection_id)
+            .group_by(
+                StoreItemRevision.collection_id,
+                StoreItemRevision.item_id)
+            .subquery()
+            )
+    await db.execute(
+            pg_insert(StoreItemHead)
+            .from_select(
+                ['collection_id', 'item_id', 'revision', 'deleted'],
+                select(
+                    StoreItemRevision.collection_id,
+                    StoreItemRevision.item_id,
+                    StoreItemRevision.revision,
+                    _revision_deleted())
+                .join(
+                    last,
+                    (StoreItemRevision.collection_id == last.c.collection_id) &
+                    (StoreItemRevision.item_id == last.c.item_id) &
+                    (StoreItemRevision.revision == last.c.revision)
+                    )
+                )
+            )
+
+async def compact_payloads(db: AsyncSession, collection_id: int, batch_size: int = STREAM_BATCH_SIZE) -> int:
+    """Move inline data of collection revisions to deduplicated store_payload rows"""
+    n = 0
+    while True:
+        rows = (await db.execute(
+                select(StoreItemRevision.id, StoreItemRevision._data)
+                .where(
+                    (StoreItemRevision.collection_id == collection_id) &
+                    (func.jsonb_typeof(StoreItemRevision._data) == 'object')
+                    )
+                .limit(batch_size)
+                )).all()
+        if not rows:
+            return n
+        updates = [{'id': rev_id, 'payload_hash': payload_hash(data), '_data': None} for rev_id, data in rows]
+        await db.execute(
+                pg_insert(StorePayload)
+                .on_conflict_do_nothing(index_elements=[StorePayload.hash]),
+                [{'hash': u['payload_hash'], 'data': data} for u, (_, data) in zip(updates, rows)]
+                )
+        await db.execute(update(StoreItemRevision), updates)
+        n += len(rows)
+
+async def upgrade_schema(conn: AsyncConnection):
+    """Create missing tables and add missing columns to existing ones, fill
+    item heads of collections written before they were maintained"""
+    await conn.run_sync(DBModel.metadata.create_all)
+    for stmt in SCHEMA_UPGRADES:
+        await conn.execute(text(stmt))
+    collection_ids = (await conn.scalars(
+            select(StoreCollection.id)
+            .where(
+                exists().where(StoreItemRevision.collection_id == StoreCollection.id) &
+                ~exists().where(StoreItemHead.collection_id == StoreCollection.id))
+            )).all()
+    for collection_id in collection_ids:
+        await rebuild_item_heads(conn, collection_id)
+        log.info(f"Rebuilt item heads of collection {collection_id}")
+
+async def drop_checkpoints(db: AsyncSession, collection_id: int):
+    """Delete checkpoints of a collection, the next one is due after
+    CHECKPOINT_INTERVAL_REVISIONS revisions in total"""
+    await db.execute(delete(StoreCheckpoint).where(StoreCheckpoint.collection_id == collection_id))
+    await db.execute(
+            update(StoreCollection)
+            .where(StoreCollection.id == collection_id)
+            .values(
+                revisions_since_checkpoint=(
+                    select(func.count())
+                    .where(StoreItemRevision.collection_id == collection_id)
+                    .scalar_subquery()),
+                checkpoint_timestamp=None)
+            .execution_options(synchronize_session=False)
+            )
+
+async def delete_orphan_payloads(db: AsyncSession):
+    await db.execute(
+            delete(StorePayload)
+            .where(~exists().where(StoreItemRevision.payload_hash == StorePayload.hash))
+            )
+
+class StoreCheckpoint(DBModel):
+    """Snapshot of a collection state used as a starting point for time_end queries.
+
+    revisions maps item_id to [revision, store_item_revision.id] of the last
+    revision of each item with timestamp <= checkpoint timestamp, items it
+    deletes are left out. Revisions with id > last_revision_id were written
+    after the checkpoint and have to be replayed on top of it, deletions
+    included.
+    """
+    __tablename__ = 'store_checkpoint'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    collection_id: Mapped[int] = mapped_column(ForeignKey('store_collection.id'), nullable=False)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_revision_id: Mapped[int] = mapped_column(nullable=False)
+    revisions: Mapped[dict[str, list[int]]] = mapped_column(JSONB, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<StoreCheckpoint[{self.id}]: {self.collection_id} at {self.timestamp} ({len(self.revisions)} items)>"
+
+Index('idx_checkpoint_collection_timestamp',
+      StoreCheckpoint.collection_id,
+      StoreCheckpoint.timestamp)
+
+# Keyed by collection id and last revision id, so any process adding
+# revisions makes the entry stale. The TTL covers maintenance that doesn't add
+# revisions, like compacting payloads.
+_collections_info_cache: TTLCache[tuple[int, Optional[int]], CollectionInfo] = TTLCache(maxsize=256, ttl=60)
+
+async def get_collections_info(db: AsyncSession, collection_ids: Iterable[int]) -> dict[int, CollectionInfo]:
+    """Collection statistics, computed with a single aggregate query for all
+    collections that are not cached at their last revision yet"""
+    last_revision_ids = dict((await db.execute(
+            select(StoreCollection.id, StoreCollection.last_revision_id)
+            .where(StoreCollection.id.in_(list(collection_ids)))
+            )).tuples().all())
+    result = {}
+    missing = []
+    for collection_id, last_revision_id in last_revision_ids.items():
+        info = _collections_info_cache.get((collection_id, last_revision_id))
+        if info:
+            result[collection_id] = info
+        else:
+            missing.append(collection_id)
+    if not missing:
+        return result
+
+    revisions = (
+            select(
+                StoreItemRevision.collection_id,
+                func.count(StoreItemRevision.id).label('num_revisions'),
+                func.min(StoreItemRevision.timestamp).label('first_timestamp'),
+                func.max(StoreItemRevision.timestamp).label('last_timestamp'),
+                func.sum(func.pg_column_size(StoreItemRevision._data)).label('data_size'))
+            .where(StoreItemRevision.collection_id.in_(missing))
+            .group_by(StoreItemRevision.collection_id)
+            .subquery()
+            )
+    payload_refs = (
+            select(StoreItemRevision.collection_id, StoreItemRevision.payload_hash)
+            .where(StoreItemRevision.collection_id.in_(missing))
+            .distinct()
+            .subquery()
+            )
+    payloads = (
+            select(
+                payload_refs.c.collection_id,
+                func.sum(func.pg_column_size(StorePayload.data)).label('data_size'))
+            .join(StorePayload, StorePayload.hash == payload_refs.c.payload_hash)
+            .group_by(payload_refs.c.collection_id)
+            .subquery()
+            )
+    heads = (
+            select(
+                StoreItemHead.collection_id,
+                func.count().label('num_items'),
+                func.count().filter(StoreItemHead.deleted).label('num_deleted'))
+            .where(StoreItemHead.collection_id.in_(missing))
+            .group_by(StoreItemHead.collection_id)
+            .subquery()
+            )
+    rows = await db.execute(
+            select(
+                StoreCollection.id,
+                StoreCollection.name,
+                StoreCollection.item_type,
+                func.coalesce(heads.c.num_items, 0),
+                func.coalesce(heads.c.num_deleted, 0),
+                func.coalesce(revisions.c.num_revisions, 0),
+                revisions.c.first_timestamp,
+                revisions.c.last_timestamp,
+                func.coalesce(revisions.c.data_size, 0) + func.coalesce(payloads.c.data_size, 0))
+            .outerjoin(revisions, revisions.c.collection_id == StoreCollection.id)
+            .outerjoin(payloads, payloads.c.collection_id == StoreCollection.id)
+            .outerjoin(heads, heads.c.collection_id == StoreCollection.id)
+            .where(StoreCollection.id.in_(missing))
+            )
+    for row in rows:
+        info = CollectionInfo(
+                id=row[0],
+                name=row[1],
+                item_type=row[2],
+                num_items=row[3],
+                num_deleted=row[4],
+                num_revisions=row[5],
+                first_timestamp=row[6],
+                last_timestamp=row[7],
+                data_size=row[8]
+                )
+        _collections_info_cache[(info.id, last_revision_ids[info.id])] = info
+        result[info.id] = info
+    return result
+
 class VersionedCollection(ABC, Generic[ModelT]):
     store_collection_name: ClassVar[str]
     store_item_type: Optional[str] = None
     store_item_class: Optional[type[ModelT] | TypeAdapter[ModelT]] = None
+    store_deduplicate_payloads: ClassVar[bool] = settings.store_deduplicate_payloads
 
     _collection: StoreCollection
     _db: AsyncSession
@@ -185,6 +505,13 @@ class VersionedCollection(ABC, Generic[ModelT]):
 
         #log.info(f"{self.__class__.__name__}: time interval {self._time_start} - {self._time_end}")
 
+    async def rebind(self, db: AsyncSession) -> Self:
+        """Same collection and time interval, bound to another db session"""
+        collection = await db.get(StoreCollection, self._collection.id)
+        if not collection:
+            raise NotFoundError(f"Collection {self._collection.name} not found")
+        return self.__class__(collection, time_start=self._time_start, time_end=self._time_end)
+
     def _from_dict(self, value: dict[str, Any]) -> Optional[ModelT]:
         #log.info(f"{self.__class__.__name__}: from_dict {self.store_item_class=} {value=}")
         if not value:
@@ -201,15 +528,19 @@ class VersionedCollection(ABC, Generic[ModelT]):
     def _to_dict(self, value: ModelT) -> dict[str, Any]:
         return value.model_dump(mode='json')
 
-    async def _revision_info(self, r: StoreItemRevision) -> ItemRevisionInfo:
-        return ItemRevisionInfo(
+    def _revision_info(self, r: StoreItemRevision, user_name: str, info_class: type[ItemRevisionInfo] = ItemRevisionInfo, **kwargs) -> ItemRevisionInfo:
+        return info_class(
+                **kwargs,
                 revision=r.revision,
                 timestamp=r.timestamp,
                 deleted=r.deleted,
-                user=(await r.awaitable_attrs.user).name,
-                data=self._from_dict(r.data)
+                user=user_name,
+                data=r.data and self._from_dict(r.data) or None
                 )
 
+    def roles_for(self, client_permissions: ClientPermissions):
+        return self._collection.roles_for(client_permissions)
+
     async def grant_permission(self, user: UserInDB, role: Role) -> Permission:
         permission = Permission(
             object_type='collection',
@@ -244,19 +575,54 @@ class VersionedCollection(ABC, Generic[ModelT]):
             condition = condition & (StoreItemRevision.timestamp <= self._time_end)
         return condition
 
-    async def _all_last_revisions(self) -> Iterable[StoreItemRevision]:
+    @property
+    def _is_head_query(self) -> bool:
+        # store_item_head only knows the current state, anything limited in
+        # time has to be reconstructed from the revision history
+        return not (self._time_start or self._time_end)
+
+    def _filter_heads(
+            self,
+            item_id: Optional[str] = None,
+            include_deleted: bool = False):
+        condition = (StoreItemHead.collection_id == self._collection.id)
+        if item_id:
+            condition = condition & (StoreItemHead.item_id == item_id)
+        if not include_deleted:
+            condition = condition & (StoreItemHead.deleted == False)
+        return condition
+
+    def _select_head_revisions(
+            self,
+            item_id: Optional[str] = None,
+            include_deleted: bool = False):
+        return (
+                select(StoreItemRevision)
+                .join(
+                    StoreItemHead,
+                    (StoreItemRevision.collection_id == StoreItemHead.collection_id) &
+                    (StoreItemRevision.item_id == StoreItemHead.item_id) &
+                    (StoreItemRevision.revision == StoreItemHead.revision)
+                    )
+                .where(self._filter_heads(item_id, include_deleted=include_deleted))
+                )
+
+    def _select_history_last_revisions(self, condition, include_deleted: bool = False):
+        """Last revision of each item among the ones matching condition. Like
+        with heads, an item is deleted if that revision deletes it, not
+        when it has older revisions that don't"""
         subquery = (
                 select(
                     StoreItemRevision.collection_id,
                     StoreItemRevision.item_id,
                     func.max(StoreItemRevision.revision).label('revision'))
-                .where(self._filter_revisions())
+                .where(condition)
                 .group_by(
                     StoreItemRevision.collection_id,
                     StoreItemRevision.item_id)
                 .subquery()
                 )
-        return await self._db.scalars(
+        query = (
                 select(StoreItemRevision)
                 .join(
                     subquery,
@@ -265,28 +631,222 @@ class VersionedCollection(ABC, Generic[ModelT]):
                     (StoreItemRevision.revision == subquery.c.revision)
                     )
                 )
+        if not include_deleted:
+            query = query.where(~_revision_deleted())
+        return query
+
+    async def _select_last_revisions(self):
+        if self._is_head_query:
+            return self._select_head_revisions()
+
+        if self._time_end and not self._time_start:
+            checkpoint = await self._find_checkpoint(self._time_end)
+            if checkpoint:
+                return await self._select_checkpoint_revisions(checkpoint)
+
+        return self._select_history_last_revisions(self._filter_revisions(include_deleted=True))
+
+    async def _find_checkpoint(self, timestamp: datetime) -> Optional[StoreCheckpoint]:
+        return await self._db.scalar(
+                select(StoreCheckpoint)
+                .where(
+                    (StoreCheckpoint.collection_id == self._collection.id) &
+                    (StoreCheckpoint.timestamp <= timestamp)
+                    )
+                .order_by(StoreCheckpoint.timestamp.desc())
+                .limit(1)
+                )
+
+    async def _select_checkpoint_revisions(self, checkpoint: StoreCheckpoint):
+        last = {item_id: tuple(rev) for item_id, rev in checkpoint.revisions.items()}
+        tail = await self._db.execute(
+                select(
+                    StoreItemRevision.item_id,
+                    StoreItemRevision.revision,
+                    StoreItemRevision.id)
+                .where(
+                    self._filter_revisions(include_deleted=True) & (
+                        (StoreItemRevision.timestamp > checkpoint.timestamp) |
+                        (StoreItemRevision.id > checkpoint.last_revision_id)
+                        )
+                    )
+                )
+        n_tail = 0
+        for item_id, revision, revision_id in tail:
+            prev = last.get(item_id)
+            if not prev or prev[0] < revision:
+                last[item_id] = (revision, revision_id)
+            n_tail += 1
+        log.debug(f"{self.store_collection_name}: Using checkpoint {checkpoint.timestamp} with {len(last)} items, replayed {n_tail} revisions")
+        return (
+                select(StoreItemRevision)
+                .where(
+                    (StoreItemRevision.id == any_(
+                        bindparam('revision_ids', [rev_id for _, rev_id in last.values()], type_=ARRAY(Integer))
+                        )) &
+                    ~_revision_deleted()
+                    )
+                )
+
+    async def write_checkpoint(self) -> StoreCheckpoint:
+        now = datetime.now(timezone.utc)
+        condition = (
+                (StoreItemRevision.collection_id == self._collection.id) &
+                (StoreItemRevision.timestamp <= now)
+                )
+        last_revision_id = await self._db.scalar(
+                select(func.max(StoreItemRevision.id))
+                .where(StoreItemRevision.collection_id == self._collection.id)
+                )
+        rows = await self._db.execute(
+                self._select_history_last_revisions(condition)
+                .with_only_columns(
+                    StoreItemRevision.item_id,
+                    StoreItemRevision.revision,
+                    StoreItemRevision.id)
+                )
+        checkpoint = StoreCheckpoint(
+                collection_id=self._collection.id,
+                timestamp=now,
+                last_revision_id=last_revision_id or 0,
+                revisions={item_id: [revision, revision_id] for item_id, revision, revision_id in rows}
+                )
+        self._db.add(checkpoint)
+        await self._db.execute(
+                update(StoreCollection)
+                .where(StoreCollection.id == self._collection.id)
+                .values(revisions_since_checkpoint=0, checkpoint_timestamp=now)
+                .execution_options(synchronize_session=False)
+                )
+        set_committed_value(self._collection, 'revisions_since_checkpoint', 0)
+        set_committed_value(self._collection, 'checkpoint_timestamp', now)
+        await self._db.flush()
+        log.info(f"{self.store_collection_name}: Written checkpoint at {now} with {len(checkpoint.revisions)} items")
+        return checkpoint
+
+    async def _maybe_write_checkpoint(self):
+        # Counters were just returned by _update_last_change
+        n_new = self._collection.revisions_since_checkpoint
+        last = self._collection.checkpoint_timestamp
+        if not n_new:
+            return
+        if n_new >= CHECKPOINT_INTERVAL_REVISIONS or (
+                last and datetime.now(timezone.utc) - last >= CHECKPOINT_INTERVAL_TIME):
+            await self.write_checkpoint()
+
+    async def _all_last_revisions(self) -> Iterable[StoreItemRevision]:
+        return await self._db.scalars(await self._select_last_revisions())
 
     async def _item_last_revision(
             self,
             item_id: str,
             include_deleted: bool = False
             ) -> StoreItemRevision:
-        return await self._db.scalar(
+        if self._is_head_query:
+            return await self._db.scalar(
+                    self._select_head_revisions(item_id, include_deleted=include_deleted)
+                    )
+
+        revision = await self._db.scalar(
                 select(StoreItemRevision)
-                .where(self._filter_revisions(item_id, include_deleted=include_deleted))
+                .where(self._filter_revisions(item_id, include_deleted=True))
                 .order_by(StoreItemRevision.revision.desc())
                 .limit(1)
                 )
+        if revision and not include_deleted and (revision.deleted or not revision.data):
+            return None
+        return revision
+
+    async def _item_head_revision(self, item_id: str) -> Optional[int]:
+        return await self._db.scalar(
+                select(StoreItemHead.revision)
+                .where(self._filter_heads(item_id, include_deleted=True))
+                )
+
+    async def _item_head_revisions(self, item_ids: Iterable[str]) -> dict[str, int]:
+        result = await self._db.execute(
+                select(StoreItemHead.item_id, StoreItemHead.revision)
+                .where(
+                    (StoreItemHead.collection_id == self._collection.id) &
+                    (StoreItemHead.item_id.in_(item_ids))
+                    )
+                )
+        return {item_id: revision for item_id, revision in result}
+
+    async def _update_head(self, item_id: str, revision: int, deleted: bool):
+        await self._update_heads({item_id: (revision, deleted)})
+
+    async def _update_heads(self, heads: dict[str, tuple[int, bool]]):
+        if not heads:
+            return
+        stmt = pg_insert(StoreItemHead)
+        await self._db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[StoreItemHead.collection_id, StoreItemHead.item_id],
+                    set_={
+                        'revision': stmt.excluded.revision,
+                        'deleted': stmt.excluded.deleted
+                        },
+                    where=(StoreItemHead.revision <= stmt.excluded.revision)
+                    ),
+                [
+                    {
+                        'collection_id': self._collection.id,
+                        'item_id': item_id,
+                        'revision': revision,
+                        'deleted': deleted
+                        } for item_id, (revision, deleted) in heads.items()
+                    ]
+                )
+
+    async def _update_last_change(self, last_revision_id: int, last_timestamp: datetime, num_revisions: int):
+        row = (await self._db.execute(
+                update(StoreCollection)
+                .where(StoreCollection.id == self._collection.id)
+                .values(
+                    last_revision_id=func.greatest(StoreCollection.last_revision_id, last_revision_id),
+                    last_timestamp=func.greatest(StoreCollection.last_timestamp, last_timestamp),
+                    revisions_since_checkpoint=StoreCollection.revisions_since_checkpoint + num_revisions)
+                .returning(
+                    StoreCollection.last_revision_id,
+                    StoreCollection.last_timestamp,
+                    StoreCollection.revisions_since_checkpoint,
+                    StoreCollection.checkpoint_timestamp)
+                .execution_options(synchronize_session=False)
+                )).one()
+        for key, value in row._mapping.items():
+            set_committed_value(self._collection, key, value)
+
+    def _select_revisions(
+            self,
+            item_id: Optional[str] = None,
+            include_deleted: bool = False,
+            after_id: Optional[int] = None,
+            limit: Optional[int] = None
+            ):
+        condition = self._filter_revisions(item_id, include_deleted=include_deleted)
+        if after_id is not None:
+            condition = condition & (StoreItemRevision.id > after_id)
+        query = (
+                select(StoreItemRevision, UserInDB.name)
+                .join(UserInDB, StoreItemRevision.user_id == UserInDB.id)
+                .where(condition)
+                .order_by(StoreItemRevision.id)
+                )
+        if limit:
+            query = query.limit(limit)
+        return query
 
     async def _revisions(
             self,
             item_id: Optional[str] = None,
-            include_deleted: bool = False
+            include_deleted: bool = False,
+            after_id: Optional[int] = None,
+            limit: Optional[int] = None
             ):
-        return await self._db.scalars(
-                select(StoreItemRevision)
-                .where(self._filter_revisions(item_id, include_deleted=include_deleted))
-                .order_by(StoreItemRevision.revision)
+        """Revisions ordered by id, each with the name of the user who made it"""
+        return await self._db.execute(
+                self._select_revisions(item_id, include_deleted=include_deleted, after_id=after_id, limit=limit)
                 )
 
     async def item_last_value(
@@ -304,20 +864,29 @@ class VersionedCollection(ABC, Generic[ModelT]):
             item_id: str,
             include_deleted: bool = False
             ) -> AsyncGenerator[ItemRevisionInfo]:
-        for r in await self._revisions(item_id, include_deleted=include_deleted):
-            yield await self._revision_info(r)
+        for r, user_name in await self._revisions(item_id, include_deleted=include_deleted):
+            yield self._revision_info(r, user_name)
 
     async def all_revisions(
             self,
-            include_deleted: bool = False
+            include_deleted: bool = False,
+            after_id: Optional[int] = None,
+            limit: Optional[int] = None
             ) -> CollectionWithRevisions:
-        revisions = await self._revisions(include_deleted=include_deleted)
+        """Revision history grouped by item.
+
+        Pass last_id of the previous result as after_id to get the next page
+        of at most limit revisions.
+        """
+        revisions = await self._revisions(include_deleted=include_deleted, after_id=after_id, limit=limit)
         items = {}
         n_revisions = 0
-        for r in revisions:
+        last_id = None
+        for r, user_name in revisions:
             item_revisions = items.setdefault(r.item_id, [])
-            item_revisions.append(await self._revision_info(r))
+            item_revisions.append(self._revision_info(r, user_name))
             n_revisions += 1
+            last_id = r.id
 
         return CollectionWithRevisions(
                 id=self._collection.id,
@@ -325,7 +894,8 @@ class VersionedCollection(ABC, Generic[ModelT]):
                 item_type=self._collection.item_type,
                 num_items=len(items),
                 num_revisions=n_revisions,
-                items=items)
+                items=items,
+                last_id=last_id)
  
     async def all_last_values(self) -> AsyncGenerator[ModelT]:
         result = await self._all_last_revisions()
@@ -337,6 +907,31 @@ class VersionedCollection(ABC, Generic[ModelT]):
             if value:
                 yield value
 
+    async def stream_last_values(self, batch_size: int = STREAM_BATCH_SIZE) -> AsyncGenerator[ModelT]:
+        """Like all_last_values, but fetches rows from a server-side cursor batch by batch"""
+        result = await self._db.stream_scalars(
+                (await self._select_last_revisions())
+                .execution_options(yield_per=batch_size)
+                )
+        async for item in result:
+            if not item.data:
+                continue
+            value = self._from_dict(item.data)
+            if value:
+                yield value
+
+    async def stream_revisions(
+            self,
+            include_deleted: bool = False,
+            batch_size: int = STREAM_BATCH_SIZE
+            ) -> AsyncGenerator[ItemRevisionRecord]:
+        result = await self._db.stream(
+                self._select_revisions(include_deleted=include_deleted)
+                .execution_options(yield_per=batch_size)
+                )
+        async for r, user_name in result:
+            yield self._revision_info(r, user_name, ItemRevisionRecord, item_id=r.item_id)
+
     async def add(
             self,
             user: User,
@@ -346,32 +941,156 @@ class VersionedCollection(ABC, Generic[ModelT]):
             revision: Optional[int] = None,
             deleted: bool = False,
             ) -> StoreItemRevision:
-        if not revision:
-            last = await self._item_last_revision(item_id, include_deleted=True)
-            if last:
-                revision = last.revision+1
+        return (await self.add_many(user, [ItemUpdate(
+            item_id,
+            data,
+            timestamp=timestamp,
+            revision=revision,
+            deleted=deleted
+            )]))[0]
+
+    async def add_many(
+            self,
+            user: User,
+            updates: Iterable[ItemUpdate[ModelT]]
+            ) -> list[StoreItemRevision]:
+        """Add revisions for a batch of items with a single INSERT
+
+        Revision numbers not given explicitly are allocated with one query for
+        the whole batch. Returns the new revisions in the order of updates.
+        """
+        updates = list(updates)
+        if not updates:
+            return []
+
+        last_revisions = await self._item_head_revisions({u.item_id for u in updates if not u.revision})
+        now = datetime.now(timezone.utc)
+        rows = []
+        values = []
+        payloads: dict[bytes, dict[str, Any]] = {}
+        heads: dict[str, tuple[int, bool]] = {}
+        for u in updates:
+            revision = u.revision
+            if not revision:
+                last = last_revisions.get(u.item_id)
+                revision = 0 if last is None else last+1
+            last_revisions[u.item_id] = revision
+            data = u.data and self._to_dict(u.data) or None
+            row = {
+                'collection_id': self._collection.id,
+                'user_id': user.id,
+                'item_id': u.item_id,
+                'timestamp': u.timestamp and u.timestamp.astimezone(timezone.utc) or now,
+                'revision': revision,
+                'deleted': u.deleted
+                }
+            if data and self.store_deduplicate_payloads:
+                h = payload_hash(data)
+                payloads[h] = data
+                row['payload_hash'] = h
             else:
-                revision = 0
-        if timestamp:
-            ts = timestamp.astimezone(timezone.utc)
+                row['_data'] = data
+            rows.append(row)
+            values.append(data)
+            head = heads.get(u.item_id)
+            if not head or head[0] <= revision:
+                heads[u.item_id] = (revision, u.deleted or not data)
+
+        if payloads:
+            await self._db.execute(
+                    pg_insert(StorePayload)
+                    .on_conflict_do_nothing(index_elements=[StorePayload.hash]),
+                    [{'hash': h, 'data': data} for h, data in payloads.items()]
+                    )
+        result = list(await self._db.scalars(
+                insert(StoreItemRevision).returning(StoreItemRevision, sort_by_parameter_order=True),
+                rows
+                ))
+        for r, data in zip(result, values):
+            # RETURNING doesn't load the payload relationship, keep the data
+            # around without marking revisions as modified
+            if r._data is None:
+                set_committed_value(r, '_data', data)
+        await self._update_heads(heads)
+        await self._update_last_change(
+                max(r.id for r in result),
+                max(r.timestamp for r in result),
+                len(result))
+        await self._maybe_write_checkpoint()
+        log.info(f"{self.store_collection_name}: Added {len(result)} new revisions for {len(heads)} items")
+        return result
+
+    async def changes_since(
+            self,
+            since_id: Optional[int] = None,
+            since: Optional[datetime] = None
+            ) -> CollectionDelta[ModelT]:
+        """Items added, changed or deleted after revision since_id and/or timestamp since.
+
+        last_id of the result is the high-water mark to pass as since_id next time.
+        """
+        condition = (StoreItemRevision.collection_id == self._collection.id)
+        if self._time_end:
+            condition = condition & (StoreItemRevision.timestamp <= self._time_end)
+        newer = condition
+        if since_id is not None:
+            newer = newer & (StoreItemRevision.id > since_id)
+        if since:
+            newer = newer & (StoreItemRevision.timestamp > since)
+
+        last_id = await self._db.scalar(select(func.max(StoreItemRevision.id)).where(condition))
+        result = CollectionDelta(
+                since_id=since_id,
+                since=since,
+                last_id=last_id,
+                changed=[],
+                deleted=[])
+        if last_id is None or (since_id is not None and last_id <= since_id):
+            return result
+
+        affected = select(StoreItemRevision.item_id).where(newer).distinct()
+        if self._time_end:
+            query = self._select_history_last_revisions(
+                    condition & (StoreItemRevision.item_id.in_(affected)),
+                    include_deleted=True)
         else:
-            ts = datetime.now(timezone.utc)
+            query = (
+                    self._select_head_revisions(include_deleted=True)
+                    .where(StoreItemHead.item_id.in_(affected))
+                    )
 
-        item = StoreItemRevision(
-                collection_id=self._collection.id,
-                user=user,
-                item_id=item_id,
-                data=data and self._to_dict(data) or None,
-                timestamp=ts,
-                revision=revision,
-                deleted=deleted
+        for r in await self._db.scalars(query):
+            value = r.data and not r.deleted and self._from_dict(r.data)
+            if value:
+                result.changed.append(value)
+            else:
+                result.deleted.append(r.item_id)
+        return result
+
+    async def last_revision_id(self) -> Optional[int]:
+        if self._is_head_query:
+            return (await self.last_change())[0]
+        return await self._db.scalar(
+                select(func.max(StoreItemRevision.id))
+                .where(self._filter_revisions(include_deleted=True))
                 )
-        self._db.add(item)
-        log.info(f"{self.store_collection_name}: Added new revision {item.revision} (timestamp: {item.timestamp}) for item {item_id}")
-        return item
 
     async def last_timestamp(self) -> datetime | None:
         return await self._db.scalar(
                 select(func.max(StoreItemRevision.timestamp))
                 .where(self._filter_revisions())
                 )
+
+    async def last_change(self) -> tuple[Optional[int], Optional[datetime]]:
+        """Id and timestamp of the last revision, deletions included"""
+        if self._is_head_query:
+            last_id, last_timestamp = (await self._db.execute(
+                    select(StoreCollection.last_revision_id, StoreCollection.last_timestamp)
+                    .where(StoreCollection.id == self._collection.id)
+                    )).one()
+            return last_id, last_timestamp
+        last_id, last_timestamp = (await self._db.execute(
+                select(func.max(StoreItemRevision.id), func.max(StoreItemRevision.timestamp))
+                .where(self._filter_revisions(include_deleted=True))
+                )).one()
+        return last_id, last_timestamp
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 import re
-from typing import Iterable, Literal
+from typing import Iterable, Literal, Optional
 
 from pydantic import Field, ValidationError
 from pydantic_core import PydanticCustomError
@@ -24,27 +24,36 @@ class PlacementLoader(LoadFromUrlOrFile):
                 feature.properties.name in self.ignored_names
                 )
 
-    def _get_revisions(self, path: str = "", params: dict[str, str] = {}) -> Iterable[PlacementEntityRevision]:
-        for item in self.load_json(path, params):
+    async def _get_revisions(
+            self,
+            path: str = "",
+            params: dict[str, str] = {},
+            ctx: Optional[ImportContext] = None
+            ) -> list[PlacementEntityRevision]:
+        revs = []
+        for item in await self.load_json(path, params, ctx):
             try:
-                yield PlacementEntityRevision.model_validate(item)
+                revs.append(PlacementEntityRevision.model_validate(item))
             except ValidationError as e:
                 log.warning(f"Validation failed", exc_info=e)
+        return revs
 
-    def get_features(self):
-        revs = list(self._get_revisions())
+    async def get_features(self, ctx: Optional[ImportContext] = None) -> list[PlacementEntityFeature]:
+        revs = await self._get_revisions(ctx=ctx)
         log.info(f"Got total {len(revs)} placement entities")
+        features = []
         for item in revs:
             if item.deleted:
                 continue
             if not item.geojson.properties:
                 raise PydanticCustomError('feature_properties_missing', "Feature is missing properties")
-            if self.is_ignored(item.feature):
+            if self.is_ignored(item.geojson):
                 continue
             item.geojson.id = f"_{item.id}"
-            yield item.geojson
+            features.append(item.geojson)
+        return features
 
-    def get_revisions(self, time_start: datetime) -> Iterable[PlacementEntityRevision]:
+    async def get_revisions(self, time_start: datetime) -> list[PlacementEntityRevision]:
         if self.offline:
             raise RuntimeError("PlacementLoader: Incremental placement import only possible from live API")
         if not self.url:
@@ -52,40 +61,46 @@ class PlacementLoader(LoadFromUrlOrFile):
 
         req_time_start = time_start.replace(tzinfo=timezone.utc).astimezone(timezone_cet)
         log.debug(f"Request new revisions since {time_start} / {req_time_start}")
-        revs = list(self._get_revisions("/raw", {'startTime': req_time_start.replace(tzinfo=None).isoformat()}))
+        revs = await self._get_revisions("/raw", {'startTime': req_time_start.replace(tzinfo=None).isoformat()})
         log.info(f"Got {len(revs)} new entity revisions since {time_start}")
         return revs
 
 
 class Importer_PlacementFull(ImporterMatching[PlacementEntityFeature]):
+    ASYNC = True
+
     type: Literal['placement_full'] = 'placement_full'
     collection: str = 'placement'
 
-    def get_features(self, ctx: ImportContext) -> Iterable[PlacementEntityFeature]:
+    async def get_features_async(self, ctx: ImportContext):
         if not isinstance(ctx.loader, PlacementLoader):
             raise RuntimeError("Loader is not PlacementLoader")
         loader: PlacementLoader = ctx.loader
-        return loader.get_features()
+        for f in await loader.get_features(ctx):
+            yield f
 
 class Importer_PlacementIncremental(ImporterIncremental[PlacementEntityFeature]):
     type: Literal['placement_incremental'] = 'placement_incremental'
     collection: str = 'placement'
 
-    def get_revisions(self, ctx: ImportContext, time_start: datetime) -> Iterable[ItemRevisionProtocol[PlacementEntityFeature]]:
+    async def get_revisions(self, ctx: ImportContext, time_start: datetime) -> Iterable[ItemRevisionProtocol[PlacementEntityFeature]]:
         if not isinstance(ctx.loader, PlacementLoader):
             raise RuntimeError("Loader is not PlacementLoader")
         loader: PlacementLoader = ctx.loader
-        return loader.get_revisions(time_start)
+        return await loader.get_revisions(time_start)
 
 class Importer_PlacementKML(ImporterMatching):
+    ASYNC = True
+
     type: Literal['placement_kml'] = 'placement_kml'
     collection: str = 'placement'
 
-    def get_features(self, ctx: ImportContext) -> Iterable[PlacementEntityFeature]:
+    async def get_features_async(self, ctx: ImportContext):
         if not isinstance(ctx.loader, PowerMapKML):
             raise RuntimeError("Loader is not PowerMapKML")
         idx = 1000
-        for item in ctx.loader.folders['Placement'].features:
+        folders = await ctx.loader.load_placemarks(['Placement'], ctx)
+        for item in folders['Placement']:
             m = re.search(r'id=(\d+)', item.description or "")
             if m:
                 item_id = m[1]
@@ -102,7 +117,7 @@ class Importer_PlacementKML(ImporterMatching):
             yield PlacementEntityFeature(
                     type='Feature',
                     id=item_id,
-                    geometry=item.geometry.__geo_interface__,
+                    geometry=item.geometry,
                     properties=PlacementEntityProperties.model_validate({
                         'name': item.name,
                         'powerNeed': power_need
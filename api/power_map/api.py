@@ -7,7 +7,7 @@ from fastapi.responses import PlainTextResponse
 
 from common.geometry import Feature, FeatureCollection, Polygon, Point, LineString, to_geojson_feature_collection
 from common.types import NameDescriptionModel
-from core.dependencies import RequiredProjectRole_Any
+from core.dependencies import ProjectVersionDep, RequiredProjectRole_Any
 from power_map.dependencies import PowerGridDep
 from power_map.power_area import PowerArea, PowerAreaStats, PowerAreaInfo
 from power_map.power_consumer import PowerConsumerColoringMode, PowerConsumerPropertiesWithStatsStyled
@@ -47,6 +47,7 @@ async def get_power_areas_json(
 @router.get("/areas.csv",
             dependencies=[RequiredProjectRole_Any])
 async def get_power_areas_csv(
+        version: ProjectVersionDep,
         power_grid: PowerGridDep,
         ) -> PlainTextResponse:
     with io.StringIO() as b:
@@ -54,7 +55,7 @@ async def get_power_areas_csv(
                   power_grid.areas_recursive(),
                   PowerArea.csv_row_properties,
                   PowerArea.CSV_COLUMNS)
-        return PlainTextResponse(b.getvalue(), media_type="text/csv")
+        return version.apply(PlainTextResponse(b.getvalue(), media_type="text/csv"))
 
 @router.get("/grid.geojson",
             dependencies=[RequiredProjectRole_Any])
@@ -96,6 +97,7 @@ async def get_power_grid_coverage_geojson(
 
 @router.get("/grid_cables.csv")
 async def get_power_grid_cables_csv(
+        version: ProjectVersionDep,
         power_grid: PowerGridDep,
         csv_header: bool = False,
         include_native: bool = False) -> PlainTextResponse:
@@ -104,27 +106,24 @@ async def get_power_grid_cables_csv(
                   filter(lambda x: include_native or not x.native, power_grid._cables),
                   PowerGridCable.csv_row_properties,
                   csv_header and PowerGridCable.CSV_COLUMNS or None)
-        return PlainTextResponse(b.getvalue(), media_type="text/csv")
+        return version.apply(PlainTextResponse(b.getvalue(), media_type="text/csv"))
 
 @router.get("/grid_pdus.csv")
 async def get_power_grid_pdus_csv(
+        version: ProjectVersionDep,
         power_grid: PowerGridDep,
         csv_header: bool = False,
         include_native: bool = False) -> PlainTextResponse:
-    pdus = {}
-    for pdu in power_grid._pdus:
-        if pdu.native and not include_native:
-            continue
-        pdus.setdefault(pdu.size, []).append(pdu)
+    pdus = power_grid.topology.pdu_count_by_size(include_native)
 
     columns = list(reversed(PowerGridItemSizeOrder))[1:]
-    result = [len(pdus.get(power_size, [])) for power_size in columns]
+    result = [int(pdus[PowerGridItemSizeOrder.index(power_size)]) for power_size in columns]
     with io.StringIO() as b:
         write_csv(b,
                   [result],
                   lambda x: x,
                   csv_header and columns or None)
-        return PlainTextResponse(b.getvalue(), media_type="text/csv")
+        return version.apply(PlainTextResponse(b.getvalue(), media_type="text/csv"))
 
 
 @router.get("/placement_entities.geojson",
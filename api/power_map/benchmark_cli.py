@@ -0,0 +1,261 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import count
+import inspect
+import os
+import platform
+from statistics import median
+import subprocess
+from time import perf_counter
+import tracemalloc
+from typing import Annotated, Any, Callable, Literal, Optional
+
+from pydantic import BaseModel, PrivateAttr
+import typer
+from rich import print
+from rich.table import Table
+
+from common.cli import AsyncTyper
+from common.db_async import get_db_session
+from core.importer.base import ImportContext
+from core.importer.matching import ImporterMatching
+from core.project import create_project
+from core.user import get_user_db
+from power_map.api import (
+        get_placement_entities_geojson,
+        get_power_areas_geojson,
+        get_power_grid_coverage_geojson,
+        get_power_grid_geojson,
+        get_power_grid_styled_geojson,
+        )
+from power_map.log import log
+from power_map.power_grid import PowerGrid, PowerGridFeature
+from power_map.power_grid_pdu import PowerGridPDUFeature
+from power_map.power_grid_snapshot import PowerGridState, dump_power_grid, load_power_grid
+from power_map.synthetic import SyntheticData, generate, load_base_data, translate_feature
+from project_configs.bl import get_default_project_config
+
+# Consumers added one by one in the add_item stage
+ADD_ITEM_SAMPLE = 100
+
+# Distance a PDU is moved by in the update_grid_features stage, degrees
+UPDATE_MOVE = 0.0002
+
+GEOJSON_ENDPOINTS = {
+        'areas.geojson': get_power_areas_geojson,
+        'grid.geojson': get_power_grid_geojson,
+        'grid_styled.geojson': get_power_grid_styled_geojson,
+        'grid_coverage.geojson': get_power_grid_coverage_geojson,
+        'placement_entities.geojson': get_placement_entities_geojson,
+        }
+
+class BenchmarkStageResult(BaseModel):
+    times: list[float]
+    time_min: float
+    time_median: float
+    memory_peak: int
+
+class BenchmarkScaleResult(BaseModel):
+    counts: dict[str, int]
+    stages: dict[str, BenchmarkStageResult]
+
+class BenchmarkResult(BaseModel):
+    commit: Optional[str]
+    timestamp: datetime
+    python: str
+    repeat: int
+    scales: dict[int, BenchmarkScaleResult]
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[Any], Any]
+    setup: Callable[[], Any] = lambda: None
+
+class Importer_Synthetic(ImporterMatching[PowerGridFeature]):
+    type: Literal['synthetic'] = 'synthetic'
+    loader: Optional[str] = None
+    collection: str = 'power_grid'
+
+    _features: list[PowerGridFeature] = PrivateAttr(default_factory=list)
+
+    def get_features(self, ctx: ImportContext):
+        return self._features
+
+async def _call(fn: Callable, *args) -> Any:
+    result = fn(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+async def measure(stage: Stage, repeat: int) -> BenchmarkStageResult:
+    times = []
+    for _ in range(repeat):
+        state = await _call(stage.setup)
+        t = perf_counter()
+        await _call(stage.run, state)
+        times.append(perf_counter() - t)
+
+    # Separate run, tracing allocations slows everything down
+    state = await _call(stage.setup)
+    tracemalloc.start()
+    try:
+        await _call(stage.run, state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return BenchmarkStageResult(times=times, time_min=min(times), time_median=median(times), memory_peak=peak)
+
+def grid_stages(data: SyntheticData) -> list[Stage]:
+    def grid_with_areas() -> PowerGrid:
+        grid = PowerGrid()
+        grid.add_area_features(data.areas)
+        return grid
+
+    grid = grid_with_areas()
+    grid.add_grid_features(data.grid)
+    state = dump_power_grid(grid).model_dump_json()
+
+    def grid_built() -> PowerGrid:
+        return load_power_grid(PowerGridState.model_validate_json(state))
+
+    grid_full = grid_built()
+    grid_full.add_placement_features(data.placement)
+
+    pdu = next(f for f in data.grid if isinstance(f, PowerGridPDUFeature))
+    moved = translate_feature(pdu, UPDATE_MOVE, 0)
+
+    def add_items(grid: PowerGrid):
+        for f in data.placement[:ADD_ITEM_SAMPLE]:
+            grid.add_placement_feature(f)
+        grid.update_load_flow()
+
+    stages = [
+            Stage('add_area_features', lambda grid: grid.add_area_features(data.areas), PowerGrid),
+            Stage('add_grid_features', lambda grid: grid.add_grid_features(data.grid), grid_with_areas),
+            Stage('update_grid_features', lambda grid: grid.update_grid_features([moved]), grid_built),
+            Stage('add_placement_features', lambda grid: grid.add_placement_features(data.placement), grid_built),
+            Stage('add_item', add_items, grid_built),
+            Stage('snapshot_dump', lambda grid: dump_power_grid(grid).model_dump_json(), lambda: grid),
+            Stage('snapshot_load', lambda _: grid_built()),
+            ]
+
+    for name, endpoint in GEOJSON_ENDPOINTS.items():
+        async def run(grid: PowerGrid, endpoint=endpoint):
+            (await endpoint(grid)).model_dump_json()
+        stages.append(Stage(name, run, lambda: grid_full))
+    return stages
+
+def import_stages(ctx: ImportContext, data: SyntheticData, scale: int) -> list[Stage]:
+    """Import of the grid features into a new project and once again
+    unchanged, ids are assigned by the importer"""
+    features = [f.model_copy(update={'id': None}) for f in data.grid]
+    config = get_default_project_config('bl24')
+    n = count()
+
+    async def new_project():
+        return await create_project(ctx.db, f"benchmark_{scale}x_{next(n)}", ctx.user, config)
+
+    async def do_import(project):
+        importer = Importer_Synthetic()
+        importer._features = features
+        await importer.do_import(ImportContext(db=ctx.db, user=ctx.user, project=project, loader=None))
+
+    async def imported_project():
+        project = await new_project()
+        await do_import(project)
+        return project
+
+    return [
+            Stage('do_import', do_import, new_project),
+            Stage('do_import_unchanged', do_import, imported_project),
+            ]
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=os.path.dirname(__file__),
+                capture_output=True, check=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_result(result: BenchmarkResult, base: Optional[BenchmarkResult] = None):
+    table = Table(title=f"Benchmark at {result.commit or 'local'} ({result.timestamp.isoformat(timespec='seconds')})")
+    table.add_column("Scale", justify='right')
+    table.add_column("Stage")
+    table.add_column("Time, s", justify='right')
+    table.add_column("Memory, MiB", justify='right')
+    if base:
+        table.add_column(f"Time at {base.commit or 'local'}, s", justify='right')
+        table.add_column("Ratio", justify='right')
+
+    for scale, r in result.scales.items():
+        for name, s in r.stages.items():
+            row = [f"{scale}x", name, f"{s.time_min:.4f}", f"{s.memory_peak / 2**20:.1f}"]
+            if base:
+                b = base.scales.get(scale)
+                b = b and b.stages.get(name)
+                row += [f"{b.time_min:.4f}", f"{s.time_min / b.time_min:.2f}"] if b else ["", ""]
+            table.add_row(*row)
+    print(table)
+
+async def run_benchmark(
+        result: BenchmarkResult,
+        base: SyntheticData,
+        scales: list[int],
+        only: Optional[list[str]],
+        repeat: int,
+        ctx: Optional[ImportContext] = None):
+    for n in scales:
+        data = generate(base, n)
+        log.info(f"Scale {n}x: {data.counts()}")
+        stages = grid_stages(data)
+        if ctx:
+            stages += import_stages(ctx, data, n)
+
+        r = result.scales[n] = BenchmarkScaleResult(counts=data.counts(), stages={})
+        for stage in stages:
+            if only and stage.name not in only:
+                continue
+            r.stages[stage.name] = await measure(stage, repeat)
+            log.info(f"Scale {n}x: {stage.name} took {r.stages[stage.name].time_min:.4f}s")
+
+benchmark = AsyncTyper()
+
+@benchmark.command()
+async def run(
+        scale: Annotated[list[int], typer.Option('--scale', '-s', help="Copies of the BL24 layout")] = [1, 10],
+        stage: Annotated[Optional[list[str]], typer.Option('--stage', help="Only run these stages")] = None,
+        repeat: int = 3,
+        db_import: Annotated[bool, typer.Option('--import', help="Benchmark imports too, nothing is committed")] = False,
+        username: str = 'admin',
+        output: Annotated[Optional[str], typer.Option('--output', '-o')] = None):
+    result = BenchmarkResult(
+            commit=git_commit(),
+            timestamp=datetime.now(timezone.utc),
+            python=platform.python_version(),
+            repeat=repeat,
+            scales={})
+    base = await load_base_data()
+    if db_import:
+        async with await get_db_session() as db:
+            ctx = ImportContext(db=db, user=await get_user_db(db, username), project=None, loader=None)
+            await run_benchmark(result, base, scale, stage, repeat, ctx)
+            await db.rollback()
+    else:
+        await run_benchmark(result, base, scale, stage, repeat)
+
+    output = output or f"benchmark_{result.commit or 'local'}_{result.timestamp:%Y%m%d%H%M%S}.json"
+    with open(output, 'w') as f:
+        f.write(result.model_dump_json(indent=2))
+    print_result(result)
+    log.info(f"Results saved to {output}")
+
+@benchmark.command()
+def compare(base: str, new: str):
+    with open(base) as f:
+        result_base = BenchmarkResult.model_validate_json(f.read())
+    with open(new) as f:
+        result_new = BenchmarkResult.model_validate_json(f.read())
+    print_result(result_new, result_base)
@@ -5,14 +5,37 @@ from cachetools_async import cached
 from fastapi import Depends
 
 from common.db_async import get_db_session
-from power_map.power_grid import PowerGrid, get_power_grid
-from core.dependencies import get_project
+from power_map.power_grid import PowerGrid
+from power_map.power_grid_snapshot import get_power_grid_stored, snapshot_version
+from core.dependencies import ProjectVersionDep, get_project
+
+# Last grid built for the current time of each project, updated with changes
+# instead of being built from scratch every time, with the snapshot version
+# it was built for
+_current_grids: dict[str, tuple[str, PowerGrid]] = {}
 
 @cached(TTLCache(maxsize=64, ttl=30))
-async def get_power_grid_cached(project_name: str, time_end: Optional[datetime] = None):
+async def get_power_grid_cached(project_name: str, time_end: Optional[datetime] = None, etag: Optional[str] = None):
     async with await get_db_session() as db:
         project = await get_project(db, project_name)
-        return await get_power_grid(project, timestamp=time_end)
+        if time_end:
+            grid = await get_power_grid_stored(project, timestamp=time_end)
+        else:
+            version = snapshot_version(project)
+            base_version, base = _current_grids.get(project_name, (None, None))
+            grid = await get_power_grid_stored(project, base=base if base_version == version else None)
+            _current_grids[project_name] = (version, grid)
+        await db.commit()
+        return grid
+
+async def get_power_grid_current(
+        project_name: str,
+        version: ProjectVersionDep,
+        time_end: Optional[datetime] = None
+        ):
+    # Keyed by etag too, so the grid is never older than the validators sent
+    # along with it
+    return await get_power_grid_cached(project_name, time_end, version.etag)
 
-PowerGridDep = Annotated[PowerGrid, Depends(get_power_grid_cached)]
+PowerGridDep = Annotated[PowerGrid, Depends(get_power_grid_current)]
 
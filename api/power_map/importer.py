@@ -1,19 +1,14 @@
 from dataclasses import dataclass
-from functools import cached_property
-from typing import Iterable, Literal, Optional
+from io import BytesIO
+from typing import AsyncGenerator, Iterable, Literal, Optional
 import re
-import warnings
 
-with warnings.catch_warnings():
-    warnings.simplefilter('ignore')
-    from fastkml.kml import KML
-    from fastkml.containers import Folder
-
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from common.errors import NotFoundError
 from core.importer.base import ImportContext, LoadFromUrlOrFile, log as _log
 from core.importer.matching import ImporterMatching
+from power_map.kml import KMLPlacemark, read_folders
 from power_map.power_area import PowerAreaFeature, PowerAreaProperties
 from power_map.power_grid import PowerGrid, PowerGridFeature, PowerGridProcessedFeature
 from power_map.power_grid_base import PowerGridItemSize, PowerItemBase
@@ -36,18 +31,28 @@ def feature_desc(feature) -> str:
 class PowerMapKML(LoadFromUrlOrFile):
     type: Literal['power_map'] = 'power_map'
 
-    @cached_property
-    def folders(self) -> dict[str, Folder]:
-        kml_doc = self.load().decode()
-        kml = KML.from_string(kml_doc)
-
-        kml_folders = {}
-        for folder in kml.features[0].features:
-            name = str(folder.name).strip().replace(' ', '_')
-            log.debug(f"KML folder {name}")
-            kml_folders[name] = folder
-
-        return kml_folders
+    # Placemarks of the folders read so far
+    _placemarks: dict[str, list[KMLPlacemark]] = PrivateAttr(default_factory=dict)
+
+    async def load_placemarks(
+            self,
+            folders: Iterable[str],
+            ctx: Optional[ImportContext] = None
+            ) -> dict[str, list[KMLPlacemark]]:
+        """Placemarks of the top-level folders, only ones not read yet are
+        parsed"""
+        folders = list(folders)
+        kml_doc = await self.load(ctx=ctx)
+        missing = [name for name in folders if name not in self._placemarks]
+        if missing:
+            for name, placemarks in read_folders(BytesIO(kml_doc), missing).items():
+                log.debug(f"KML folder {name}: {len(placemarks)} placemarks")
+                self._placemarks[name] = placemarks
+
+        for name in folders:
+            if name not in self._placemarks:
+                raise RuntimeError(f"KML folder '{name}' not found")
+        return {name: self._placemarks[name] for name in folders}
 
 @dataclass
 class Override:
@@ -57,6 +62,8 @@ class Override:
     power_source: Optional[bool] = None
 
 class Importer_PowerGridRaw(ImporterMatching):
+    ASYNC = True
+
     type: Literal['power_grid'] = 'power_grid'
     collection: str = 'power_grid_raw'
 
@@ -70,7 +77,7 @@ class Importer_PowerGridRaw(ImporterMatching):
         return result;
 
     def is_ignored(self, feature) -> bool:
-        if feature.geometry.geom_type not in ['Point', 'LineString']:
+        if feature.geom_type not in ['Point', 'LineString']:
             return True
 
         return self.get_override(feature).ignore
@@ -104,18 +111,15 @@ class Importer_PowerGridRaw(ImporterMatching):
                 log.warning(f"can't determine item type: {feature_desc(feature)}")
                 return PowerGridItemSize.Unknown
 
-    def get_features(self, ctx: ImportContext) -> Iterable[PowerGridFeature]:
+    async def get_features_async(self, ctx: ImportContext) -> AsyncGenerator[PowerGridFeature]:
         log.info(self.override)
         if not isinstance(ctx.loader, PowerMapKML):
             raise RuntimeError("Loader is not PowerMapKML")
         kml: PowerMapKML = ctx.loader
-        for folder_name in self.folders:
-            folder = kml.folders.get(folder_name)
-            if not folder:
-                raise RuntimeError(f"KML folder '{folder_name}' not found")
-
-            for feature in folder.features:
-                #log.debug(f'parsing {feature.geometry.geom_type}: {feature_desc(feature)}')
+        folders = await kml.load_placemarks(self.folders, ctx)
+        for placemarks in folders.values():
+            for feature in placemarks:
+                #log.debug(f'parsing {feature.geom_type}: {feature_desc(feature)}')
                 if self.is_ignored(feature):
                     log.debug(f"ignore feature {feature_desc(feature)}")
                     continue
@@ -125,10 +129,10 @@ class Importer_PowerGridRaw(ImporterMatching):
                     log.warning("feature doesn't have a name")
                     continue
 
-                if feature.geometry.geom_type == 'Point':
+                if feature.geom_type == 'Point':
                     yield PowerGridPDUFeature(
                             type='Feature',
-                            geometry=feature.geometry.__geo_interface__,
+                            geometry=feature.geometry,
                             properties=PowerGridPDUProperties(
                                 type='power_grid_pdu',
                                 name=name,
@@ -138,10 +142,10 @@ class Importer_PowerGridRaw(ImporterMatching):
                                 power_source=self.is_power_source(feature)
                                 )
                             )
-                elif feature.geometry.geom_type == 'LineString':
+                elif feature.geom_type == 'LineString':
                     yield PowerGridCableFeature(
                             type='Feature',
-                            geometry=feature.geometry.__geo_interface__,
+                            geometry=feature.geometry,
                             properties=PowerGridCableProperties(
                                 type='power_grid_cable',
                                 name=name,
@@ -174,6 +178,8 @@ class Importer_PowerGridProcessed(ImporterMatching[PowerGridProcessedFeature]):
             yield f.to_geojson_feature(PowerItemBase.feature_properties)
 
 class Importer_PowerAreas(ImporterMatching[PowerAreaFeature]):
+    ASYNC = True
+
     type: Literal['power_areas'] = 'power_areas'
     collection: str = 'power_areas'
 
@@ -182,20 +188,18 @@ class Importer_PowerAreas(ImporterMatching[PowerAreaFeature]):
     toplevel: list[str] = Field(default_factory=list)
 
     def is_ignored(self, feature) -> bool:
-        if feature.geometry.geom_type != 'Polygon':
+        if feature.geom_type != 'Polygon':
             return True
 
         return feature.name in self.ignore
 
-    def get_features(self, ctx: ImportContext) -> Iterable[PowerAreaFeature]:
+    async def get_features_async(self, ctx: ImportContext) -> AsyncGenerator[PowerAreaFeature]:
         if not isinstance(ctx.loader, PowerMapKML):
             raise RuntimeError("Loader is not PowerMapKML")
         kml: PowerMapKML = ctx.loader
-        for folder_name in self.folders:
-            folder = kml.folders.get(folder_name)
-            if not folder:
-                raise RuntimeError(f"KML folder '{folder_name}' not found")
-            for feature in folder.features:
+        folders = await kml.load_placemarks(self.folders, ctx)
+        for placemarks in folders.values():
+            for feature in placemarks:
                 name = feature.name
                 if not name:
                     log.warning("feature doesn't have a name")
@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from typing import IO, Any, Collection, Generator, Optional
+from xml.etree.ElementTree import Element, iterparse
+
+KML_NS = '{http://www.opengis.net/kml/2.2}'
+
+# Depth of top-level folders: kml > Document > Folder
+FOLDER_DEPTH = 2
+
+Coordinates = tuple[float, ...]
+
+@dataclass
+class KMLPlacemark:
+    name: Optional[str]
+    description: Optional[str]
+    # GeoJSON geometry, None if missing or of unsupported type
+    geometry: Optional[dict[str, Any]]
+
+    @property
+    def geom_type(self) -> Optional[str]:
+        return self.geometry['type'] if self.geometry else None
+
+def folder_key(name: Optional[str]) -> str:
+    return str(name).strip().replace(' ', '_')
+
+def _tag(el: Element) -> str:
+    return el.tag.removeprefix(KML_NS)
+
+def _ns(path: str) -> str:
+    return '/'.join(KML_NS + p for p in path.split('/'))
+
+def _text(el: Element, tag: str) -> Optional[str]:
+    text = el.findtext(KML_NS + tag)
+    return text.strip() or None if text else None
+
+def _coordinates(el: Optional[Element]) -> list[Coordinates]:
+    if el is None or not el.text:
+        return []
+    return [tuple(float(v) for v in point.split(',')) for point in el.text.split()]
+
+def _bbox(points: list[Coordinates]) -> tuple[float, float, float, float]:
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def _geometry(placemark: Element) -> Optional[dict[str, Any]]:
+    """GeoJSON geometry with bbox, same as fastkml's __geo_interface__ gives"""
+    for el in placemark:
+        tag = _tag(el)
+        if tag == 'Point':
+            points = _coordinates(el.find(_ns('coordinates')))
+            return {'bbox': _bbox(points), 'type': 'Point', 'coordinates': points[0]}
+        if tag == 'LineString':
+            points = _coordinates(el.find(_ns('coordinates')))
+            return {'bbox': _bbox(points), 'type': 'LineString', 'coordinates': points}
+        if tag == 'Polygon':
+            rings = [
+                    _coordinates(ring) for ring in (
+                        *el.iterfind(_ns('outerBoundaryIs/LinearRing/coordinates')),
+                        *el.iterfind(_ns('innerBoundaryIs/LinearRing/coordinates')),
+                        )]
+            return {'bbox': _bbox(rings[0]), 'type': 'Polygon', 'coordinates': rings}
+    return None
+
+def _iter_placemarks(
+        source: str | IO[bytes],
+        folders: Optional[Collection[str]],
+        found: set[str]
+        ) -> Generator[tuple[str, KMLPlacemark]]:
+    remaining = set(folders) if folders is not None else None
+    depth = 0
+    in_folder = False
+    folder = None
+    for event, el in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if depth == FOLDER_DEPTH and _tag(el) == 'Folder':
+                in_folder = True
+            depth += 1
+            continue
+        depth -= 1
+        tag = _tag(el)
+
+        if in_folder and depth == FOLDER_DEPTH + 1 and tag == 'name' and folder is None:
+            key = folder_key(el.text)
+            if remaining is None or key in remaining:
+                folder = key
+                found.add(key)
+
+        elif tag == 'Placemark':
+            if folder is not None:
+                yield folder, KMLPlacemark(
+                        name=_text(el, 'name'),
+                        description=_text(el, 'description'),
+                        geometry=_geometry(el),
+                        )
+            el.clear()
+
+        elif depth == FOLDER_DEPTH:
+            el.clear()
+            if tag == 'Folder' and folder is not None and remaining is not None:
+                remaining.discard(folder)
+                if not remaining:
+                    return
+            in_folder = False
+            folder = None
+
+def iter_placemarks(
+        source: str | IO[bytes],
+        folders: Optional[Collection[str]] = None
+        ) -> Generator[tuple[str, KMLPlacemark]]:
+    """Placemarks of the top-level folders, with their folder key, read as the
+    file is parsed.
+
+    Folders not in folders are only scanned through, parsing stops as soon as
+    all of the requested ones are read.
+    """
+    yield from _iter_placemarks(source, folders, set())
+
+def read_folders(
+        source: str | IO[bytes],
+        folders: Optional[Collection[str]] = None
+        ) -> dict[str, list[KMLPlacemark]]:
+    """Placemarks of the top-level folders by folder key, folders missing in
+    the file are left out"""
+    found: set[str] = set()
+    result: dict[str, list[KMLPlacemark]] = {}
+    for key, placemark in _iter_placemarks(source, folders, found):
+        result.setdefault(key, []).append(placemark)
+    return {key: result.get(key, []) for key in found}
+
+__all__ = [
+        'KMLPlacemark',
+        'folder_key',
+        'iter_placemarks',
+        'read_folders',
+        ]
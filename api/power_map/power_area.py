@@ -1,15 +1,19 @@
 from functools import cached_property
-from typing import Any, ClassVar, Iterable, Self
+from typing import Any, ClassVar, Iterable, Optional, Self
+
+import numpy as np
+import shapely
 from geojson_pydantic import Feature, Polygon
 from pydantic import Field, PrivateAttr, computed_field
+from shapely import STRtree
 
-from common.geometry import GeometryPolygon, ShapelyPoint
+from common.geometry import GeometryPolygon
 from common.types import NameDescriptionModel
 from core.store import VersionedCollection
 from power_map.log import log
 from power_map.power_grid_cable import PowerGridCable
 from power_map.power_grid_pdu import PowerGridPDU
-from power_map.power_consumer import PowerConsumer
+from power_map.power_consumer import PowerConsumer, find_consumers_pdus
 
 class PowerAreaProperties(NameDescriptionModel):
     pass
@@ -52,6 +56,9 @@ class PowerArea(
     _cables: list[PowerGridCable] = PrivateAttr(default_factory=list)
     _consumers: list[PowerConsumer] = PrivateAttr(default_factory=list)
 
+    # Spatial index of sub-areas with geometry, rebuilt when they change
+    _index: Optional[tuple[STRtree, list['PowerArea']]] = PrivateAttr(None)
+
     nest_level: int = 0
 
     @classmethod
@@ -84,45 +91,104 @@ class PowerArea(
         for item in self._cables:
             yield item
 
+    def _sub_area_index(self) -> tuple[STRtree, list['PowerArea']]:
+        areas = [area for area in self._areas.values() if area.geometry]
+        if self._index is None or len(areas) != len(self._index[1]) or any(a is not b for a, b in zip(areas, self._index[1])):
+            shapes = [area.shape for area in areas]
+            shapely.prepare(shapes)
+            self._index = (STRtree(shapes), areas)
+        return self._index
+
+    def _find_sub_areas(
+            self,
+            items: list[PowerGridPDU | PowerGridCable | PowerConsumer],
+            result: dict[tuple[int, int], list['PowerArea']]
+            ):
+        """Find sub-areas containing each item on all levels below, in the order
+        add_item adds the item to them"""
+        if not items or not self._areas:
+            return
+        tree, areas = self._sub_area_index()
+        points = []
+        for item in items:
+            if isinstance(item, PowerGridCable):
+                points.append(shapely.get_coordinates(item.shape))
+            elif isinstance(item, PowerConsumer):
+                points.append(shapely.get_coordinates(item.shape.centroid))
+            else:
+                points.append(shapely.get_coordinates(item.shape))
+        n_points = [len(p) for p in points]
+        coords = np.concatenate(points) if points else np.empty((0, 2))
+        item_idx = np.repeat(np.arange(len(items)), n_points)
+
+        idx_point, idx_area = tree.query(shapely.points(coords))
+        inside = shapely.contains_xy(tree.geometries[idx_area], coords[idx_point, 0], coords[idx_point, 1])
+        idx_point, idx_area = idx_point[inside], idx_area[inside]
+        # Sub-areas of an item ordered by its points, then by order of sub-areas.
+        # Cables are added once to each sub-area name along them.
+        order = np.lexsort((idx_area, idx_point))
+        members: dict[int, list[PowerArea]] = {}
+        for i, a in zip(item_idx[idx_point[order]].tolist(), idx_area[order].tolist()):
+            found = members.setdefault(i, [])
+            if not isinstance(items[i], PowerGridCable) or all(area.name != areas[a].name for area in found):
+                found.append(areas[a])
+
+        by_area: dict[int, list] = {}
+        for i, found in members.items():
+            result[(id(self), id(items[i]))] = found
+            for area in found:
+                by_area.setdefault(id(area), []).append(items[i])
+        for area in areas:
+            area._find_sub_areas(by_area.get(id(area), []), result)
+
     def add_item(self, item: PowerGridPDU | PowerGridCable | PowerConsumer, debug=False):
+        self.add_items([item], debug=debug)
+
+    def add_items(self, items: Iterable[PowerGridPDU | PowerGridCable | PowerConsumer], debug=False):
+        """Add items to this area and sub-areas containing them, found for all
+        items at once. Consumers get PDUs of this area, ones added along with
+        them included."""
+        items = list(items)
+        find_consumers_pdus(
+                [item for item in items if isinstance(item, PowerConsumer) and not item._up_to_date],
+                self._pdus + [item for item in items if isinstance(item, PowerGridPDU)])
+        sub_areas: dict[tuple[int, int], list[PowerArea]] = {}
+        self._find_sub_areas(items, sub_areas)
+        for item in items:
+            self._add_item(item, sub_areas, debug)
+
+    def _add_item(
+            self,
+            item: PowerGridPDU | PowerGridCable | PowerConsumer,
+            sub_areas: dict[tuple[int, int], list['PowerArea']],
+            debug=False
+            ):
         item._areas.append(self)
-        sub_area_found = False
         if isinstance(item, PowerGridPDU):
             if debug:
                 log.debug(f"{self.name}: PDU: [{item.size}] {item}")
             self._pdus.append(item)
-            for sub_area in self._areas.values():
-                if sub_area.contains(item.shape):
-                    sub_area.add_item(item, debug=False)
-                    sub_area_found = True
         elif isinstance(item, PowerGridCable):
             if debug:
                 log.debug(f"{self.name}: Cable: [{item.size}] {item}")
             self._cables.append(item)
-            cable_areas = []
-            for p in item.shape.coords:
-                for sub_area in self._areas.values():
-                    if sub_area.contains(ShapelyPoint(p)) and sub_area.name not in cable_areas:
-                        sub_area.add_item(item, debug=False)
-                        sub_area_found = True
-                        cable_areas.append(sub_area.name)
         elif isinstance(item, PowerConsumer):
             if debug:
                 log.debug(f"{self.name}: Consumer: {item}")
             if not item._up_to_date:
                 item.find_pdus(self._pdus)
             self._consumers.append(item)
-            for sub_area in self._areas.values():
-                if sub_area.contains(item.shape.centroid):
-                    sub_area.add_item(item, debug=False)
-                    sub_area_found = True
 
-        if self._areas and not sub_area_found:
+        found = sub_areas.get((id(self), id(item)), [])
+        for sub_area in found:
+            sub_area._add_item(item, sub_areas)
+
+        if self._areas and not found:
             #log.warning(f"{self.name}: Can't find sub-area for {item}")
             misc_name = f"{self.name}-misc"
             if misc_name not in self._areas:
                 self._areas[misc_name] = PowerArea(id=misc_name, name=misc_name, geometry=None)
-            self._areas[misc_name].add_item(item)
+            self._areas[misc_name]._add_item(item, sub_areas)
 
     def print(self, dump_grid=False, level=0):
         if level == 0:
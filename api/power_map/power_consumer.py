@@ -3,8 +3,11 @@ from math import inf
 from typing import Any, ClassVar, Iterable, Literal, Optional
 
 import matplotlib as mpl
+import numpy as np
+import shapely
 
 from pydantic import PrivateAttr
+from shapely import STRtree
 from pydantic_extra_types.color import Color
 
 from common.geometry import GeometryPolygon, PolygonStyle
@@ -13,6 +16,9 @@ from power_map.log import log
 from power_map.power_grid_base import PowerItemBase
 from power_map.power_grid_pdu import PowerGridPDU
 
+# Consumers are supplied from PDUs this close
+PDU_REACH_M = 50
+
 class PowerConsumerColoringMode(str, Enum):
     power_need = 'power_need'
     grid_coverage = 'grid_coverage'
@@ -41,25 +47,7 @@ class PowerConsumer(
     ColoringMode: ClassVar[type] = Literal['power_need'] | Literal['grid_coverage'] | Literal['sound']
 
     def find_pdus(self, pdus: Iterable[PowerGridPDU]):
-        p_item = self.shape_proj.centroid
-        best_distance = inf
-        nr_pdus = 0
-        if not self.power_need:
-            self._up_to_date = True
-            return
-        for pdu in pdus:
-            distance = p_item.distance(pdu.shape_proj)
-            if distance < best_distance:
-                best_distance = distance
-            if distance > 50:
-                continue
-            nr_pdus += 1
-            pdu._consumers.append(self)
-        if best_distance > 50:
-            log.warning(f"Nearest PDU is too far ({best_distance:.0f}m) for '{self}'")
-        self.power_nearest_pdu_distance = int(best_distance)
-        self.power_nr_pdus = nr_pdus
-        self._up_to_date = True
+        find_consumers_pdus([self], list(pdus))
 
     def feature_properties(self, context: Optional[Any] = None) -> PowerConsumerPropertiesWithStats:
         return PowerConsumerPropertiesWithStats.model_validate(self, from_attributes=True)
@@ -91,6 +79,33 @@ class PowerConsumer(
         return Color('#'+bytes(COLORMAP_SOUND(COLORNORM_SOUND(self.amplified_sound), bytes=True))[:3].hex())
 
 
+def find_consumers_pdus(consumers: list[PowerConsumer], pdus: list[PowerGridPDU]):
+    """Find the nearest PDU and PDUs within reach of each consumer that needs
+    power, with spatial index queries for all of them at once"""
+    for consumer in consumers:
+        consumer._up_to_date = True
+    consumers = [consumer for consumer in consumers if consumer.power_need]
+    if not consumers:
+        return
+    centroids = shapely.centroid(np.array([consumer.shape_proj for consumer in consumers], dtype=object))
+    tree = STRtree([pdu.shape_proj for pdu in pdus])
+    if pdus:
+        _, distances = tree.query_nearest(centroids, return_distance=True, all_matches=False)
+    else:
+        distances = np.full(len(consumers), inf)
+    idx_consumer, idx_pdu = tree.query(centroids, predicate='dwithin', distance=PDU_REACH_M)
+    # In order of consumers, then PDUs, like checking every PDU for each consumer
+    order = np.lexsort((idx_pdu, idx_consumer))
+    for i, j in zip(idx_consumer[order].tolist(), idx_pdu[order].tolist()):
+        pdus[j]._consumers.append(consumers[i])
+    nr_pdus = np.bincount(idx_consumer, minlength=len(consumers)).tolist()
+
+    for consumer, best_distance, n in zip(consumers, distances.tolist(), nr_pdus):
+        if best_distance > PDU_REACH_M:
+            log.warning(f"Nearest PDU is too far ({best_distance:.0f}m) for '{consumer}'")
+        consumer.power_nearest_pdu_distance = int(best_distance)
+        consumer.power_nr_pdus = n
+
 COLORMAP_PWR_HIGH = mpl.colormaps['plasma']
 COLORNORM_PWR_HIGH= mpl.colors.Normalize(vmin=0, vmax=7400)
 COLORMAP_PWR_LOW = mpl.colormaps['winter']
@@ -1,9 +1,14 @@
+import logging
 from datetime import datetime, timezone
 from typing import Iterable, Optional
+import numpy as np
+import shapely
 from pydantic import PrivateAttr, RootModel, TypeAdapter
+from shapely import STRtree
 
 from common.geometry import (
-        coord_transform, XFRM_GEO_TO_PROJ,
+        project_objects, project_shapes, shape,
+        ShapelyBaseGeometry,
         Feature, FeatureCollection,
         Point, LineString,
         ShapelyPoint, ShapelyLineString,
@@ -11,7 +16,7 @@ from common.geometry import (
 from core.store import VersionedCollection
 from placement.types import PlacementEntityFeature
 from power_map.power_area import PowerArea, PowerAreaFeature, PowerAreaFeatureCollection
-from power_map.power_consumer import PowerConsumer
+from power_map.power_consumer import PowerConsumer, find_consumers_pdus
 from power_map.power_grid_cable import (
         PowerGridCable,
         PowerGridCableFeature,
@@ -22,6 +27,9 @@ from power_map.power_grid_pdu import (
         PowerGridPDUFeature,
         PowerGridProcessedPDUProperties
         )
+from power_map.power_grid_base import PowerGridItemSize, PowerGridItemSizeOrder
+from power_map.power_grid_load_flow import PowerGridLoadFlow
+from power_map.power_grid_topology import PowerGridTopology
 from power_map.log import log
 from power_map.itemized_log import ItemizedLogCollector
 
@@ -37,26 +45,76 @@ PowerGridFeatureCollectionType = FeatureCollection[Feature[Point, PowerGridProce
 
 NEAR_THRESHOLD_M = 1
 
-def cut_line_at_points(line: ShapelyLineString, points: Iterable[ShapelyPoint]) -> list[ShapelyLineString]:
-    p_coords = [list(p.coords)[0] for p in points]
-    coords = list(line.coords) + p_coords
-    distances = [line.project(ShapelyPoint(p)) for p in coords]
-    coords = [p for (d, p) in sorted(zip(distances, coords))]
-    lines = []
-    chunk = []
-    for p in coords:
-        chunk.append(p)
-        if len(chunk) > 1 and p in p_coords:
-            lines.append(ShapelyLineString(chunk))
-            chunk = [p]
-    if len(chunk) > 1:
-        lines.append(ShapelyLineString(chunk))
-    else:
-        last_point = lines[-1].coords[-1]
-        d = coord_transform(XFRM_GEO_TO_PROJ, ShapelyPoint(last_point)).distance(coord_transform(XFRM_GEO_TO_PROJ, ShapelyPoint(chunk[0])))
-        log.debug(f'leftover point distance {d}')
-
-    return lines
+def cut_lines_at_points(
+        lines: list[ShapelyLineString],
+        points: list[list[ShapelyPoint]]
+        ) -> list[list[ShapelyLineString]]:
+    """Cut each line into parts ending at its points.
+
+    Vertices and points are ordered by position along the line, then by
+    coordinates. A line is cut at every vertex or point that has the same
+    coordinates as one of its points. Lines and parts have z only if the line
+    and all its points have it.
+    """
+    if not lines:
+        return []
+    lines_arr = np.array(lines, dtype=object)
+    line_coords, line_idx = shapely.get_coordinates(lines_arr, include_z=True, return_index=True)
+    n_points = [len(pts) for pts in points]
+    point_coords = shapely.get_coordinates(np.array([p for pts in points for p in pts], dtype=object), include_z=True)
+    point_idx = np.repeat(np.arange(len(lines)), n_points)
+    coords = np.concatenate((line_coords, point_coords))
+    group = np.concatenate((line_idx, point_idx))
+
+    has_z = np.isfinite(coords[:, 2])
+    line_has_z = np.bincount(group, weights=(~has_z).astype(float), minlength=len(lines)) == 0
+    # Shorter coordinate tuples sort first
+    z_key = np.where(has_z, coords[:, 2], -np.inf)
+    dist = shapely.line_locate_point(lines_arr[group], shapely.points(coords[:, :2]))
+    order = np.lexsort((z_key, coords[:, 1], coords[:, 0], dist, group))
+
+    keys = np.column_stack((group, coords[:, 0], coords[:, 1], z_key))
+    _, key_ids = np.unique(keys, axis=0, return_inverse=True)
+    key_ids = key_ids.reshape(-1)
+    is_cut = np.isin(key_ids[order], key_ids[len(line_coords):])
+    coords, group = coords[order], group[order]
+
+    first = np.ones(len(group), dtype=bool)
+    first[1:] = group[1:] != group[:-1]
+    last = np.ones(len(group), dtype=bool)
+    last[:-1] = first[1:]
+    bounds = np.flatnonzero(first | is_cut | last)
+    same_line = group[bounds[:-1]] == group[bounds[1:]]
+    seg_start, seg_end = bounds[:-1][same_line], bounds[1:][same_line]
+    seg_group = group[seg_start]
+
+    seg_len = seg_end - seg_start + 1
+    seg_offset = np.concatenate(([0], np.cumsum(seg_len)[:-1]))
+    vertex_idx = np.arange(seg_len.sum()) - np.repeat(seg_offset - seg_start, seg_len)
+    vertex_seg = np.repeat(np.arange(len(seg_start)), seg_len)
+    segments = np.empty(len(seg_start), dtype=object)
+    for with_z, dims in ((True, 3), (False, 2)):
+        segs = line_has_z[seg_group] == with_z
+        vertices = segs[vertex_seg]
+        if vertices.any():
+            _, indices = np.unique(vertex_seg[vertices], return_inverse=True)
+            segments[segs] = shapely.linestrings(coords[vertex_idx[vertices], :dims], indices=indices)
+
+    result: list[list[ShapelyLineString]] = [[] for _ in lines]
+    for g, segment in zip(seg_group.tolist(), segments):
+        result[g].append(segment)
+    return result
+
+def near_ends(lines: list[ShapelyLineString], points: list[ShapelyPoint]) -> list[bool]:
+    """Whether each point is near either end of the line paired with it"""
+    if not lines:
+        return []
+    lines_arr = np.array(lines, dtype=object)
+    points_arr = np.array(points, dtype=object)
+    return (
+            (shapely.distance(points_arr, shapely.get_point(lines_arr, 0)) < NEAR_THRESHOLD_M) |
+            (shapely.distance(points_arr, shapely.get_point(lines_arr, -1)) < NEAR_THRESHOLD_M)
+            ).tolist()
 
 def sort_by_size(items: list[PowerGridItem], descending=True):
     items.sort(key=lambda it: it.size, reverse=descending)
@@ -80,9 +138,38 @@ class PowerGrid(PowerArea):
     _log: ItemizedLogCollector = PrivateAttr()
     _timestamp: datetime = PrivateAttr()
 
+    # Messages of assigning PDUs to cables and splitting cables, and of
+    # connecting and orienting, are collected apart so each can be redone for
+    # the parts of the grid touched by a change. Overloads are checked for the
+    # whole grid every time. _log has all of them.
+    _log_assign: ItemizedLogCollector = PrivateAttr()
+    _log_connect: ItemizedLogCollector = PrivateAttr()
+    _log_load: ItemizedLogCollector = PrivateAttr()
+
+    # Source features with their projected shapes, items built from each
+    # feature (a PDU, a cable or its split parts) and PDU feature ids assigned
+    # to each cable feature
+    _features: dict[str, PowerGridFeature] = PrivateAttr(default_factory=dict)
+    _feature_shapes: dict[str, ShapelyBaseGeometry] = PrivateAttr(default_factory=dict)
+    _feature_items: dict[str, list[PowerGridItem]] = PrivateAttr(default_factory=dict)
+    _cable_pdus: dict[str, set[str]] = PrivateAttr(default_factory=dict)
+    _has_sources: Optional[bool] = PrivateAttr(None)
+
+    # Revision high-water marks of the collections the grid was built from
+    _areas_revision_id: Optional[int] = PrivateAttr(None)
+    _grid_revision_id: Optional[int] = PrivateAttr(None)
+
+    # Built on first use after the grid was changed
+    _topology: Optional[PowerGridTopology] = PrivateAttr(None)
+    _load_flow: Optional[PowerGridLoadFlow] = PrivateAttr(None)
+
     def __init__(self, timestamp=None):
         super().__init__(id="<TopLevel>", name="<TopLevel>", geometry=None)
-        self._log = ItemizedLogCollector(log.getChild('validation'))
+        logger = log.getChild('validation')
+        self._log = ItemizedLogCollector(logger)
+        self._log_assign = ItemizedLogCollector(logger)
+        self._log_connect = ItemizedLogCollector(logger)
+        self._log_load = ItemizedLogCollector(logger)
         self._timestamp = timestamp or datetime.now(timezone.utc)
 
     def add_area_feature(self, f: PowerAreaFeature) -> PowerArea:
@@ -92,167 +179,392 @@ class PowerGrid(PowerArea):
         self._areas[area.id] = area
         return area
 
+    def add_area_features(self, features: Iterable[PowerAreaFeature]) -> list[PowerArea]:
+        areas = [self.add_area_feature(f) for f in features]
+        project_objects(areas)
+        return areas
+
     def add_grid_features(self, features: Iterable[PowerGridFeature]):
-        pdus = []
-        cables = []
-        for f in features:
-            if isinstance(f, PowerGridCableFeature):
-                cables.append(PowerGridCable.from_feature(f))
-            elif isinstance(f, PowerGridPDUFeature):
-                pdus.append(PowerGridPDU.from_feature(f))
+        self.update_grid_features(features)
+
+    def update_grid_features(
+            self,
+            changed: Iterable[PowerGridFeature] = (),
+            deleted: Iterable[str] = ()
+            ):
+        """Apply added or changed and deleted grid features.
+
+        Only cables near a changed feature get their PDUs assigned and are
+        split again, only the parts of the grid electrically connected to them
+        are energized again and only new items are assigned to areas.
+        """
+        changed = [f for f in changed if isinstance(f, (PowerGridCableFeature, PowerGridPDUFeature))]
+        changed_ids = {f.id for f in changed}
+        deleted = {fid for fid in deleted if fid in self._features} - changed_ids
+        if not changed and not deleted:
+            return
+        self._topology = None
+
+        seed_shapes = [self._feature_shapes[fid] for fid in changed_ids | deleted if fid in self._feature_shapes]
+        for fid in deleted:
+            del self._features[fid]
+            del self._feature_shapes[fid]
+        changed_shapes = project_shapes(shape(f.geometry) for f in changed)
+        for f, shape_proj in zip(changed, changed_shapes):
+            self._features[f.id] = f
+            self._feature_shapes[f.id] = shape_proj
+        seed_shapes += changed_shapes
+
+        pdu_ids = [fid for fid, f in self._features.items() if isinstance(f, PowerGridPDUFeature)]
+        cable_ids = [fid for fid, f in self._features.items() if isinstance(f, PowerGridCableFeature)]
+        pdu_tree = STRtree([self._feature_shapes[fid] for fid in pdu_ids])
+        cable_tree = STRtree([self._feature_shapes[fid] for fid in cable_ids])
+
+        # Assignment of PDUs to cables only changes near changed features,
+        # before or after the change
+        touched = changed_ids | deleted
+        for ids, tree in ((pdu_ids, pdu_tree), (cable_ids, cable_tree)):
+            if ids:
+                _, idx = tree.query(seed_shapes, predicate='dwithin', distance=NEAR_THRESHOLD_M)
+                touched.update(ids[i] for i in idx.tolist())
+        rebuild_cables = [fid for fid in cable_ids if fid in touched]
+        recheck_pdus = [fid for fid in pdu_ids if fid in touched]
+
+        rebuild = deleted | changed_ids | set(rebuild_cables)
+        removed = [item for fid in rebuild for item in self._feature_items.pop(fid, [])]
+        for fid in rebuild:
+            self._cable_pdus.pop(fid, None)
+        # Everything that was fed through the removed items has to be energized again
+        reconnect = self._connected_items(removed)
+        self._detach_items(removed)
+        self._log_assign.entries = [
+                e for e in self._log_assign.entries
+                if e.item_id not in rebuild and e.item_id not in recheck_pdus]
+
+        new_items = []
+        for fid in changed_ids:
+            f = self._features[fid]
+            if isinstance(f, PowerGridPDUFeature):
+                pdu = PowerGridPDU.from_feature(f)
+                pdu.set_shape_proj(self._feature_shapes[fid])
+                self._feature_items[fid] = [pdu]
+                new_items.append(pdu)
 
-        sort_by_size(pdus)
+        cables = []
+        for fid in rebuild_cables:
+            cable = PowerGridCable.from_feature(self._features[fid])
+            cable.set_shape_proj(self._feature_shapes[fid])
+            cables.append(cable)
         sort_by_size(cables)
 
-        # Step 1: assign PDUs to cables by proximity
-        sources = []
-        for pdu in pdus:
-            found = False
-            if pdu.power_source:
-                sources.append(pdu)
-            for cable in cables:
-                if cable.size > pdu.size:
-                    continue
-                d = cable.distance_m(pdu)
-                if d < NEAR_THRESHOLD_M and (
-                        pdu.power_source or cable.size <= pdu.size):
-                    cable._pdus.append(pdu)
-                    found = True
-            if not found:
-                self._log.error(pdu.id, f"Unable to assign PDU to any cable line")
-                continue
-
+        pdus_by_size = [self._feature_items[fid][0] for fid in pdu_ids]
+        sort_by_size(pdus_by_size)
+        pdu_rank = {pdu.id: i for i, pdu in enumerate(pdus_by_size)}
+
+        # Step 1: assign PDUs to cables by proximity, only PDUs that the
+        # spatial index finds within threshold are candidates
+        if cables and pdu_ids:
+            idx_cable, idx_pdu = pdu_tree.query(
+                    [cable.shape_proj for cable in cables],
+                    predicate='dwithin',
+                    distance=NEAR_THRESHOLD_M)
+            near_pdus: list[list[PowerGridPDU]] = [[] for _ in cables]
+            for i, j in zip(idx_cable.tolist(), idx_pdu.tolist()):
+                near_pdus[i].append(self._feature_items[pdu_ids[j]][0])
+            for cable, candidates in zip(cables, near_pdus):
+                candidates.sort(key=lambda p: pdu_rank[p.id])
+                for pdu in candidates:
+                    if cable.size > pdu.size:
+                        continue
+                    d = cable.distance_m(pdu)
+                    if d < NEAR_THRESHOLD_M and (
+                            pdu.power_source or cable.size <= pdu.size):
+                        cable._pdus.append(pdu)
         for cable in cables:
-            cable._pdus.sort(key=lambda p: p.size, reverse=True)
+            self._cable_pdus[cable.id] = {pdu.id for pdu in cable._pdus}
+
+        recheck = [self._feature_items[fid][0] for fid in recheck_pdus]
+        recheck.sort(key=lambda p: pdu_rank[p.id])
+        if recheck and cable_ids:
+            idx_pdu, idx_cable = cable_tree.query(
+                    [pdu.shape_proj for pdu in recheck],
+                    predicate='dwithin',
+                    distance=NEAR_THRESHOLD_M)
+            assigned = {
+                    recheck[i].id
+                    for i, j in zip(idx_pdu.tolist(), idx_cable.tolist())
+                    if recheck[i].id in self._cable_pdus[cable_ids[j]]}
+        else:
+            assigned = set()
+        for pdu in recheck:
+            if pdu.id not in assigned:
+                self._log_assign.error(pdu.id, f"Unable to assign PDU to any cable line")
 
         # Step 2: split cables that have multiple PDUs into simple separate pieces
         # from one PDU to the next
-        cables_split = []
-        for cable in cables:
-            n_pdus = len(cable._pdus)
-            if n_pdus > 2:
-                mid_points = []
-                for p in cable._pdus:
-                    if not any([p.shape_proj.distance(ep) < NEAR_THRESHOLD_M for ep in cable.end_points_proj]) and p.size >= cable.size:
-                        mid_points.append(p.shape)
-                segments = cut_line_at_points(cable.shape, mid_points)
-                seg_lengths = []
-                ok = True
-                new_cables = []
-                for idx, segment in enumerate(segments):
-                    length = coord_transform(XFRM_GEO_TO_PROJ, segment).length
-                    if length < NEAR_THRESHOLD_M:
-                        continue
-                    c = PowerGridCable(
-                            type='power_grid_cable',
-                            id=f"{cable.id}p{idx}",
-                            geometry=segment.__geo_interface__,
-                            name=f"{cable.name} #{idx}",
-                            description=cable.description,
-                            power_size=cable.size,
-                            power_native=cable.native
-                            )
-                    eps = c.end_points_proj
-                    for p in cable._pdus:
-                        if any([p.shape_proj.distance(e) < NEAR_THRESHOLD_M for e in eps]):
-                            c._pdus.append(p)
-                    if len(c._pdus) != 2:
-                        ok = False
-                    new_cables.append(c)
-                    seg_lengths.append(int(length))
-                    idx += 1
-                if len(cable._pdus) != len(new_cables)+1:
-                    self._log.error(cable.id, f"When splitting cable, got {len(new_cables)} segments between {len(cable._pdus)} PDUs")
-                if ok:
-                    self._log.info(cable.id, f"Cable has {n_pdus} PDUs, split it into parts of {seg_lengths} meters (total length {cable.length_m}m)")
-                    for c in new_cables:
-                        c.print_info()
-                    cables_split += new_cables
-                else:
-                    self._log.error(cable.id, f"Failed to split cable with {n_pdus} PDUs correctly")
-                    cables_split.append(cable)
-            else:
-                if n_pdus != 2:
-                    self._log.error(cable.id, f"Cable doesn't have at least 2 PDUs assigned")
-                cables_split.append(cable)
-
-
-        cables = cables_split
+        for cable, items in zip(cables, self._split_cables(cables)):
+            self._feature_items[cable.id] = items
+            new_items += items
 
         # Step 3: assign cables to pdus
-        for cable in cables:
+        cables_by_size = [self._features[fid] for fid in cable_ids]
+        cables_by_size.sort(key=lambda f: f.properties.size, reverse=True)
+        all_cables = [c for f in cables_by_size for c in self._feature_items[f.id]]
+        pdu_cables: dict[int, list[PowerGridCable]] = {}
+        for cable in all_cables:
             for pdu in cable._pdus:
-                pdu._cables.append(cable)
+                pdu_cables.setdefault(id(pdu), []).append(cable)
 
+        has_sources = any(pdu.power_source for pdu in pdus_by_size)
+        if has_sources != self._has_sources:
+            reconnect = pdus_by_size + all_cables
+        else:
+            removed_ids = set(map(id, removed))
+            reconnect = self._connected_items(
+                    [*new_items, *recheck, *(item for item in reconnect if id(item) not in removed_ids)],
+                    pdu_cables)
+        self._has_sources = has_sources
+        reconnect_ids = set(map(id, reconnect))
+        pdus = [pdu for pdu in pdus_by_size if id(pdu) in reconnect_ids]
+        cables = [cable for cable in all_cables if id(cable) in reconnect_ids]
+
+        item_ids = {item.id for item in pdus + cables + removed}
+        self._log_connect.entries = [
+                e for e in self._log_connect.entries
+                if e.item_id is not None and e.item_id not in item_ids]
         for pdu in pdus:
+            pdu.reset_connections()
+            pdu._cables = pdu_cables.get(id(pdu), [])
             sort_by_size(pdu._cables)
+        was_reversed = {id(cable): cable.reset_connections() for cable in cables}
 
         # Step 4: connect the pdus with cables and do final checks
-        if not len(sources):
-            self._log.error(None, f"No power sources found, unable to connect anything")
+        if not has_sources:
+            self._log_connect.error(None, f"No power sources found, unable to connect anything")
         else:
-            for pdu in sources:
-                pdu.connect(log=self._log)
+            for pdu in pdus:
+                if pdu.power_source:
+                    n_pdus, n_cables = pdu.connect(log=self._log_connect)
+                    log.info(f"Power source {pdu.id} energizes {n_pdus} PDUs and {n_cables} cables")
 
             for pdu in pdus:
                 if not pdu.power_source and not pdu._cable_in:
-                    self._log.error(pdu.id, f"PDU is not getting power")
+                    self._log_connect.error(pdu.id, f"PDU is not getting power")
 
             for cable in cables:
                 if not cable._pdu_from:
-                    self._log.error(cable.id, "Cable is not connected to source")
+                    self._log_connect.error(cable.id, "Cable is not connected to source")
                 if not cable._pdu_to:
-                    self._log.error(cable.id, "Cable is not connected to load")
-
-        for pdu in pdus:
-            self.add_item(pdu)
+                    self._log_connect.error(cable.id, "Cable is not connected to load")
 
+        new_ids = set(map(id, new_items))
+        add = [pdu for pdu in pdus if id(pdu) in new_ids]
+        flipped = []
         for cable in cables:
-            cable.orient(self._log)
-            self.add_item(cable)
+            cable.orient(self._log_connect)
+            if id(cable) in new_ids:
+                add.append(cable)
+            elif cable._reversed != was_reversed[id(cable)]:
+                # Areas of a cable are ordered along it
+                flipped.append(cable)
+                add.append(cable)
+        self._detach_items(flipped)
+        self.add_items(add)
+
+        if self._consumers and (removed or new_items):
+            for pdu in self._pdus:
+                pdu._consumers.clear()
+            find_consumers_pdus(self._consumers, self._pdus)
+
+        self.update_load_flow()
+
+    def _split_cables(self, cables: list[PowerGridCable]) -> list[list[PowerGridCable]]:
+        """Split cables with more than 2 PDUs into pieces from one PDU to the next"""
+        split = [cable for cable in cables if len(cable._pdus) > 2]
+        pairs = [(cable, pdu) for cable in split for pdu in cable._pdus]
+        mid_points: dict[int, list[ShapelyPoint]] = {id(cable): [] for cable in split}
+        is_end = near_ends([cable.shape_proj for cable, _ in pairs], [pdu.shape_proj for _, pdu in pairs])
+        for (cable, pdu), end in zip(pairs, is_end):
+            if not end and pdu.size >= cable.size:
+                mid_points[id(cable)].append(pdu.shape)
+
+        segments = cut_lines_at_points([cable.shape for cable in split], list(mid_points.values()))
+        segments_proj = project_shapes(s for cable_segments in segments for s in cable_segments)
+        lengths = shapely.length(np.array(segments_proj, dtype=object)).tolist()
+        projected = iter(zip(segments_proj, lengths))
+        pieces = [
+                [(segment, *next(projected)) for segment in cable_segments]
+                for cable_segments in segments]
+
+        # PDUs near ends of each piece long enough to keep
+        pairs = [
+                (segment_proj, pdu)
+                for cable, cable_pieces in zip(split, pieces)
+                for _, segment_proj, length in cable_pieces if length >= NEAR_THRESHOLD_M
+                for pdu in cable._pdus]
+        is_end = iter(near_ends([segment_proj for segment_proj, _ in pairs], [pdu.shape_proj for _, pdu in pairs]))
+
+        split_pieces = dict(zip(map(id, split), pieces))
+        result = []
+        for cable in cables:
+            n_pdus = len(cable._pdus)
+            if n_pdus <= 2:
+                if n_pdus != 2:
+                    self._log_assign.error(cable.id, f"Cable doesn't have at least 2 PDUs assigned")
+                result.append([cable])
+                continue
+
+            seg_lengths = []
+            ok = True
+            new_cables = []
+            for idx, (segment, segment_proj, length) in enumerate(split_pieces[id(cable)]):
+                if length < NEAR_THRESHOLD_M:
+                    continue
+                c = PowerGridCable(
+                        type='power_grid_cable',
+                        id=f"{cable.id}p{idx}",
+                        geometry=segment.__geo_interface__,
+                        name=f"{cable.name} #{idx}",
+                        description=cable.description,
+                        power_size=cable.size,
+                        power_native=cable.native
+                        )
+                c.set_shape_proj(segment_proj)
+                for pdu in cable._pdus:
+                    if next(is_end):
+                        c._pdus.append(pdu)
+                if len(c._pdus) != 2:
+                    ok = False
+                new_cables.append(c)
+                seg_lengths.append(int(length))
+            if len(cable._pdus) != len(new_cables)+1:
+                self._log_assign.error(cable.id, f"When splitting cable, got {len(new_cables)} segments between {len(cable._pdus)} PDUs")
+            if ok:
+                self._log_assign.info(cable.id, f"Cable has {n_pdus} PDUs, split it into parts of {seg_lengths} meters (total length {cable.length_m}m)")
+                if log.isEnabledFor(logging.DEBUG):
+                    for c in new_cables:
+                        c.print_info()
+                result.append(new_cables)
+            else:
+                self._log_assign.error(cable.id, f"Failed to split cable with {n_pdus} PDUs correctly")
+                result.append([cable])
+        return result
+
+    @staticmethod
+    def _connected_items(
+            items: Iterable[PowerGridItem],
+            pdu_cables: Optional[dict[int, list[PowerGridCable]]] = None
+            ) -> list[PowerGridItem]:
+        """Items reachable from items through PDU-cable links, current ones or pdu_cables"""
+        result = {id(item): item for item in items}
+        queue = list(result.values())
+        while queue:
+            item = queue.pop()
+            if isinstance(item, PowerGridPDU):
+                linked = item._cables if pdu_cables is None else pdu_cables.get(id(item), [])
+            else:
+                linked = item._pdus
+            for other in linked:
+                if id(other) not in result:
+                    result[id(other)] = other
+                    queue.append(other)
+        return list(result.values())
+
+    def _detach_items(self, items: list[PowerGridItem]):
+        """Remove items from all areas"""
+        if not items:
+            return
+        removed = set(map(id, items))
+        for area in list(self.areas_recursive()):
+            area._pdus = [it for it in area._pdus if id(it) not in removed]
+            area._cables = [it for it in area._cables if id(it) not in removed]
+            for name, sub_area in list(area._areas.items()):
+                # Leftover "-misc" areas are only created when needed
+                if not sub_area.geometry and not (sub_area._pdus or sub_area._cables or sub_area._consumers or sub_area._areas):
+                    del area._areas[name]
+        for item in items:
+            item._areas = []
+
+    @property
+    def topology(self) -> PowerGridTopology:
+        if self._topology is None:
+            self._topology = PowerGridTopology(self._pdus, self._cables)
+        return self._topology
+
+    @property
+    def load_flow(self) -> PowerGridLoadFlow:
+        if self._load_flow is None:
+            self._load_flow = PowerGridLoadFlow(self.topology)
+        return self._load_flow
+
+    def update_load_flow(self):
+        """Compute loads again and check for overloads"""
+        self._load_flow = None
+        self._log_load.entries = []
+        try:
+            self.load_flow.check(self._log_load)
+        except (ValueError, IndexError, KeyError) as e:
+            self._log_load.error(None, f"Unable to compute loads: {e}")
+        self._log.entries = self._log_assign.entries + self._log_connect.entries + self._log_load.entries
 
     def print_stats(self):
         log.info("")
-        all_cables = {}
-        all_pdus = {}
-        for item in self.grid_items:
-            #log.debug(item)
-            if item.native:
-                continue
-            if isinstance(item, PowerGridPDU):
-                all_pdus.setdefault(item.size, []).append(item)
-            elif isinstance(item, PowerGridCable):
-                all_cables.setdefault(item.size, []).append(item)
+        cable_counts, cable_lengths = self.topology.cable_stats_by_size()
+        pdu_counts = self.topology.pdu_count_by_size()
+        sizes = [PowerGridItemSize(s) for s in PowerGridItemSizeOrder]
 
-        all_total_length = 0
         log.info("Cable lines:")
-        for cable_size in sorted(all_cables.keys(), reverse=True):
-            cables = all_cables[cable_size]
-            total_length = 0
-            for cable in cables:
-                total_length += cable.length_m
-            all_total_length += total_length
-            log.info(f"  {cable_size:>3}: {total_length:,.0f}m")
-        log.info(f"Total cable length: {all_total_length:,.0f}m")
+        for code in reversed(range(len(sizes))):
+            if cable_counts[code]:
+                log.info(f"  {sizes[code]:>3}: {cable_lengths[code]:,.0f}m")
+        log.info(f"Total cable length: {cable_lengths.sum():,.0f}m")
 
-        pdu_count = 0
         log.info("PDUs:")
-        for pdu_size in sorted(all_pdus.keys(), reverse=True):
-            pdus = all_pdus[pdu_size]
-            log.info(f"  PDU {pdu_size}: {len(pdus)}")
-            pdu_count += len(pdus)
-        log.info(f"Total: {pdu_count}")
+        for code in reversed(range(len(sizes))):
+            if pdu_counts[code]:
+                log.info(f"  PDU {sizes[code]}: {pdu_counts[code]}")
+        log.info(f"Total: {pdu_counts.sum()}")
 
     def add_placement_feature(self, f: PlacementEntityFeature):
+        """Add a consumer without computing loads again, call
+        update_load_flow after the last one"""
         self.add_item(PowerConsumer.from_feature(f))
 
-async def get_power_grid(project: 'Project', timestamp: Optional[datetime] = None) -> PowerGrid:
+    def add_placement_features(self, features: Iterable[PlacementEntityFeature]):
+        consumers = [PowerConsumer.from_feature(f) for f in features]
+        project_objects(consumers)
+        self.add_items(consumers)
+        self.update_load_flow()
+
+async def get_power_grid(
+        project: 'Project',
+        timestamp: Optional[datetime] = None,
+        base: Optional[PowerGrid] = None
+        ) -> PowerGrid:
+    """Build power grid of the project.
+
+    Current base grid is updated in place with changed grid features instead,
+    unless areas changed since it was built, so pass a grid nothing else uses.
+    """
     c_areas = await PowerAreaFeatureCollection.bind(project, False, time_end=timestamp)
     c_grid = await PowerGridFeatureCollection.bind(project, False, time_end=timestamp)
+    areas_revision_id = await c_areas.last_revision_id()
+
+    if (base is not None and timestamp is None and
+            base._grid_revision_id is not None and
+            base._areas_revision_id == areas_revision_id):
+        delta = await c_grid.changes_since(since_id=base._grid_revision_id)
+        if delta.changed or delta.deleted:
+            log.info(f"{project.name}: Updating power grid with {len(delta.changed)} changed and {len(delta.deleted)} deleted features")
+            base.update_grid_features(delta.changed, delta.deleted)
+            base._timestamp = await c_grid.last_timestamp() or base._timestamp
+        base._grid_revision_id = delta.last_id
+        return base
 
     grid = PowerGrid(timestamp=await c_grid.last_timestamp())
-    async for area in c_areas.all_last_values():
-        grid.add_area_feature(area)
+    grid._areas_revision_id = areas_revision_id
+    grid._grid_revision_id = await c_grid.last_revision_id()
+    grid.add_area_features([area async for area in c_areas.all_last_values()])
 
     grid.add_grid_features([f async for f in c_grid.all_last_values()])
 
@@ -260,4 +572,3 @@ async def get_power_grid(project: 'Project', timestamp: Optional[datetime] = Non
     #    grid.add_placement_feature(f)
 
     return grid
-
@@ -109,6 +109,10 @@ class PowerItemBase(GeoObject):
 
 COLOR_NATIVE = "#00B9DF"
 STYLE_GRID_ITEM_SIZE = {
+    PowerGridItemSize.ThreePhase_250A: {
+        'weight': 6,
+        'color': '#8F0F1F',
+        },
     PowerGridItemSize.ThreePhase_125A: {
         'weight': 5,
         'color': '#C4162A',
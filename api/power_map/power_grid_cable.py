@@ -1,10 +1,11 @@
+import logging
 from functools import cached_property
 from typing import Any, ClassVar, Literal, Optional
 
-from shapely import distance
+from shapely import distance, reverse as reverse_coords
 from pydantic import Field, PrivateAttr, computed_field
 
-from common.geometry import Feature, GeometryLineString, LineStyle, LineString, ShapelyPoint, coord_transform, XFRM_GEO_TO_PROJ
+from common.geometry import Feature, GeometryLineString, LineStyle, LineString, ShapelyPoint
 from power_map.log import log as log_default
 from power_map.power_grid_base import PowerGridItemPropertiesBase, PowerItemBase
 
@@ -31,6 +32,7 @@ class PowerGridCable(
     _pdu_from: Optional['PowerGridPDU'] = None
     _pdu_to: Optional['PowerGridPDU'] = None
     _pdus: list['PowerGridPDU'] = PrivateAttr(default_factory=list)
+    _reversed: bool = PrivateAttr(False)
 
     @computed_field
     @cached_property
@@ -67,24 +69,23 @@ class PowerGridCable(
 
     @property
     def end_points_proj(self) -> tuple[ShapelyPoint, ShapelyPoint]:
-        ep = self.end_points
-        return coord_transform(XFRM_GEO_TO_PROJ, ep[0]), coord_transform(XFRM_GEO_TO_PROJ, ep[1])
+        return ShapelyPoint(self.shape_proj.coords[0]), ShapelyPoint(self.shape_proj.coords[-1])
 
     def has_pdu(self, pdu: 'PowerGridPDU') -> bool:
         return any([p is pdu for p in self._pdus])
 
-    def connect(self, log, pdu_from: 'PowerGridPDU', indent: str = '') -> bool:
-        log_default.debug(f"{indent} Trying to energize {self.id} from PDU {pdu_from.id}")
+    def connect(self, log, pdu_from: 'PowerGridPDU') -> Optional['PowerGridPDU']:
+        """Energize from pdu_from, returns the PDU to energize through it next"""
+        if log_default.isEnabledFor(logging.DEBUG):
+            log_default.debug(f"Trying to energize {self.id} from PDU {pdu_from.id}")
         if self._pdu_from:
             log.error(self.id, f"Cable is already energized from {self._pdu_from.id}")
-            return False
+            return None
         self._pdu_from = pdu_from
-        results = []
         for pdu in self._pdus:
             if (pdu is not pdu_from) and (not pdu._cable_in) and not (pdu.power_source):
-                return pdu.connect(log, self, indent+' → ')
-
-        return any(results)
+                return pdu
+        return None
 
     def orient(self, log):
         if not self._pdu_from and not self._pdu_to:
@@ -101,12 +102,27 @@ class PowerGridCable(
             reverse = True
 
         if reverse:
-            self.geometry.coordinates.reverse()
-            del(self.shape)
-            del(self.shape_proj)
+            self._reverse()
 
         return reverse
 
+    def _reverse(self):
+        # Geometry may be shared with the source feature, don't modify it in place
+        shape_proj = self.shape_proj
+        self.geometry = self.geometry.model_copy(update={'coordinates': self.geometry.coordinates[::-1]})
+        self.reset_shapes()
+        self.set_shape_proj(reverse_coords(shape_proj))
+        self._reversed = not self._reversed
+
+    def reset_connections(self) -> bool:
+        """Forget connections and orientation, returns whether it was reversed"""
+        was_reversed = self._reversed
+        if was_reversed:
+            self._reverse()
+        self._pdu_from = None
+        self._pdu_to = None
+        return was_reversed
+
 __all__ = [
         'PowerGridCableProperties',
         'PowerGridProcessedCableProperties',
@@ -0,0 +1,134 @@
+from math import sqrt
+
+import numpy as np
+
+from power_map.itemized_log import ItemizedLogCollector
+from power_map.power_grid_base import PowerGridItemSize, PowerGridItemSizeOrder
+from power_map.power_grid_topology import NONE, PowerGridTopology
+
+VOLTAGE_PHASE = 230.0
+VOLTAGE_LINE = 400.0
+COPPER_RESISTIVITY = 0.0175 # Ohm*mm²/m
+MAX_VOLTAGE_DROP_PERCENT = 5.0
+
+# Power need of a consumer is its peak, only a share of the summed needs of
+# many consumers is drawn at the same time. Demand factor for n consumers is
+# DEMAND_FACTOR_MIN + (1 - DEMAND_FACTOR_MIN) * n^DEMAND_FACTOR_EXPONENT, like
+# used for campsites and residential feeders.
+DEMAND_FACTOR_MIN = 0.2
+DEMAND_FACTOR_EXPONENT = -0.75
+
+SIZE_RATED_CURRENT = {
+        PowerGridItemSize.Unknown: np.nan,
+        PowerGridItemSize.SinglePhase_16A: 16,
+        PowerGridItemSize.ThreePhase_16A: 16,
+        PowerGridItemSize.ThreePhase_32A: 32,
+        PowerGridItemSize.ThreePhase_63A: 63,
+        PowerGridItemSize.ThreePhase_125A: 125,
+        PowerGridItemSize.ThreePhase_250A: 250,
+        }
+
+# Usual copper cross-section of cables of each size, mm²
+SIZE_CROSS_SECTION = {
+        PowerGridItemSize.Unknown: np.nan,
+        PowerGridItemSize.SinglePhase_16A: 2.5,
+        PowerGridItemSize.ThreePhase_16A: 2.5,
+        PowerGridItemSize.ThreePhase_32A: 6,
+        PowerGridItemSize.ThreePhase_63A: 16,
+        PowerGridItemSize.ThreePhase_125A: 35,
+        PowerGridItemSize.ThreePhase_250A: 95,
+        }
+
+def _by_size_code(values: dict[PowerGridItemSize, float]) -> np.ndarray:
+    return np.array([values[PowerGridItemSize(s)] for s in PowerGridItemSizeOrder], dtype=np.float64)
+
+RATED_CURRENT = _by_size_code(SIZE_RATED_CURRENT)
+CROSS_SECTION = _by_size_code(SIZE_CROSS_SECTION)
+SINGLE_PHASE = PowerGridItemSizeOrder.index(PowerGridItemSize.SinglePhase_16A.value)
+
+def _current(load: np.ndarray, single_phase: np.ndarray) -> np.ndarray:
+    return np.where(single_phase, load / VOLTAGE_PHASE, load / (sqrt(3) * VOLTAGE_LINE))
+
+def _demand_factor(n_consumers: np.ndarray) -> np.ndarray:
+    """Share of the summed power need of n consumers drawn at the same time"""
+    n = np.maximum(n_consumers, 1)
+    return DEMAND_FACTOR_MIN + (1 - DEMAND_FACTOR_MIN) * n ** DEMAND_FACTOR_EXPONENT
+
+class PowerGridLoadFlow:
+    """Loads, currents and voltage drops over the grid, arrays are indexed
+    like the topology.
+
+    Power need of a consumer is split evenly between PDUs it's close to, so
+    are the consumers counted for the demand factor of everything fed through
+    a PDU. Voltage drops are in percent of nominal voltage, of a cable itself
+    and accumulated from the power source to the end of it or to a PDU.
+    """
+    def __init__(self, topology: PowerGridTopology):
+        self.topology = topology
+        t = topology
+
+        # Power need on each PDU, then bottom-up total of everything fed
+        # through it, with the demand factor of its consumers
+        self.pdu_load = np.array([
+            sum(c.power_need / c.power_nr_pdus for c in pdu._consumers if c.power_nr_pdus)
+            for pdu in t.pdus], dtype=np.float64)
+        self.pdu_consumers = np.array([
+            sum(1 / c.power_nr_pdus for c in pdu._consumers if c.power_nr_pdus)
+            for pdu in t.pdus], dtype=np.float64)
+        self.pdu_total_need = self._fed_through(self.pdu_load)
+        self.pdu_total_consumers = self._fed_through(self.pdu_consumers)
+        self.pdu_total_load = self.pdu_total_need * _demand_factor(self.pdu_total_consumers)
+        self.pdu_current = _current(self.pdu_total_load, t.pdu_size == SINGLE_PHASE)
+
+        fed = t.cable_to != NONE
+        self.cable_load = np.zeros(len(t.cables), dtype=np.float64)
+        self.cable_load[fed] = self.pdu_total_load[t.cable_to[fed]]
+        single_phase = t.cable_size == SINGLE_PHASE
+        self.cable_current = _current(self.cable_load, single_phase)
+
+        resistance = COPPER_RESISTIVITY * t.cable_length / CROSS_SECTION[t.cable_size]
+        self.cable_voltage_drop = np.where(
+                single_phase,
+                2 * self.cable_current * resistance / VOLTAGE_PHASE,
+                sqrt(3) * self.cable_current * resistance / VOLTAGE_LINE) * 100
+
+        # Top-down, one level of the tree at a time
+        self.pdu_voltage_drop = np.zeros(len(t.pdus), dtype=np.float64)
+        for depth in range(1, t.pdu_depth.max(initial=0) + 1):
+            pdus = np.flatnonzero(t.pdu_depth == depth)
+            cables = t.pdu_cable_in[pdus]
+            self.pdu_voltage_drop[pdus] = self.pdu_voltage_drop[t.cable_from[cables]] + self.cable_voltage_drop[cables]
+        has_from = t.cable_from != NONE
+        self.cable_end_voltage_drop = np.full(len(t.cables), np.nan)
+        self.cable_end_voltage_drop[has_from] = self.pdu_voltage_drop[t.cable_from[has_from]] + self.cable_voltage_drop[has_from]
+
+    def _fed_through(self, values: np.ndarray) -> np.ndarray:
+        """Sum of per-PDU values over each PDU and everything fed through it"""
+        t = self.topology
+        total = np.concatenate(([0], np.cumsum(values[t.pdu_order])))
+        return total[t.pdu_end] - total[t.pdu_pos]
+
+    def check(self, log: ItemizedLogCollector):
+        t = self.topology
+        rated = RATED_CURRENT[t.cable_size]
+        for j in np.flatnonzero(self.cable_current > rated).tolist():
+            log.error(t.cables[j].id, f"Cable is overloaded: {self.cable_current[j]:.0f}A, rated {rated[j]:.0f}A")
+
+        rated = RATED_CURRENT[t.pdu_size]
+        for i in np.flatnonzero(t.pdu_power_source & (self.pdu_current > rated)).tolist():
+            log.error(t.pdus[i].id, f"Power source is overloaded: {self.pdu_current[i]:.0f}A, rated {rated[i]:.0f}A")
+
+        # Reported where the limit is first exceeded, PDUs fed through it only
+        # inherit the drop
+        over = self.pdu_voltage_drop > MAX_VOLTAGE_DROP_PERCENT
+        feeder_over = np.zeros(len(t.pdus), dtype=bool)
+        fed = t.pdu_cable_in != NONE
+        feeder_over[fed] = over[t.cable_from[t.pdu_cable_in[fed]]]
+        for i in np.flatnonzero(over & ~feeder_over).tolist():
+            n_fed = t.pdu_end[i] - t.pdu_pos[i] - 1
+            log.warning(t.pdus[i].id, f"Voltage drop is {self.pdu_voltage_drop[i]:.1f}%, more than {MAX_VOLTAGE_DROP_PERCENT:.0f}%" +
+                        (f", also at {n_fed} PDUs fed through it" if n_fed else ""))
+
+__all__ = [
+        'PowerGridLoadFlow',
+        ]
@@ -1,3 +1,4 @@
+import logging
 from typing import Literal, Optional
 
 from pydantic import Field, PrivateAttr, computed_field
@@ -50,31 +51,57 @@ class PowerGridPDU(
         return coord_transform(XFRM_PROJ_TO_GEO,
             self.shape_proj.buffer(radius, quad_segs=8))
 
-    def connect(self, log, cable_in: Optional['PowerGridCable'] = None, indent: str = ''):
-        if cable_in:
-            if self.power_source:
-                log.error(self.id, f"PDU is already power_source, can't also energize it from elsewhere")
-                return False
-            if cable_in.size != self.size:
-                log.error(self.id, f"Can't power PDU from {cable_in.id}: size mismatch")
-                return False
-            cable_in._pdu_to = self
-            self._cable_in = cable_in
-            log_default.debug(f"{indent} connected {cable_in._pdu_from.id} >-[{cable_in.id}]-> {self.id}")
-        else:
-            if not self.power_source:
-                log.error(self.id, "Cannot distribute power from PDU that is not power_source and doesn't have cable_in")
-            log.debug(self.id, f"PDU is a power source")
-
-        connected = []
-        for cable in self._cables:
-            if cable is cable_in:
+    def reset_connections(self):
+        self._cables = []
+        self._cable_in = None
+        self._cables_out = []
+
+    def connect_in(self, log, cable_in: 'PowerGridCable') -> bool:
+        if self.power_source:
+            log.error(self.id, f"PDU is already power_source, can't also energize it from elsewhere")
+            return False
+        if cable_in.size != self.size:
+            log.error(self.id, f"Can't power PDU from {cable_in.id}: size mismatch")
+            return False
+        cable_in._pdu_to = self
+        self._cable_in = cable_in
+        if log_default.isEnabledFor(logging.DEBUG):
+            log_default.debug(f"connected {cable_in._pdu_from.id} >-[{cable_in.id}]-> {self.id}")
+        return True
+
+    def connect(self, log) -> tuple[int, int]:
+        """Energize everything that can be reached from this power source.
+
+        Returns numbers of PDUs (this one included) and cables energized.
+        """
+        if not self.power_source:
+            log.error(self.id, "Cannot distribute power from PDU that is not power_source and doesn't have cable_in")
+        log.debug(self.id, f"PDU is a power source")
+
+        n_pdus, n_cables = 1, 0
+        self._cables_out = []
+        # Depth-first, cables of a PDU are tried in order and everything
+        # behind one of them is energized before the next one, so a cable
+        # reachable from several PDUs is energized from the first in this order
+        stack = [(self, iter(self._cables))]
+        while stack:
+            pdu, cables = stack[-1]
+            cable = next(cables, None)
+            if cable is None:
+                stack.pop()
+                continue
+            if cable is pdu._cable_in:
                 continue
-            if cable.connect(log, self, indent+'[]'):
-                connected.append(cable)
-        self._cables_out = connected
+            n_cables += cable._pdu_from is None
+            pdu_to = cable.connect(log, pdu)
+            if pdu_to is None or not pdu_to.connect_in(log, cable):
+                continue
+            pdu._cables_out.append(cable)
+            pdu_to._cables_out = []
+            n_pdus += 1
+            stack.append((pdu_to, iter(pdu_to._cables)))
 
-        return True
+        return n_pdus, n_cables
 
 
 __all__ = [
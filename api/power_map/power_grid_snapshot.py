@@ -0,0 +1,296 @@
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Optional
+
+import numpy as np
+import shapely
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import DateTime, ForeignKey, Index, Text, delete, func, select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Mapped, mapped_column
+
+from common.db_async import AsyncSession, DBModel
+from common.geometry import GeoObject
+from power_map.itemized_log import ItemizedLogEntry
+from power_map.log import log
+from power_map.power_area import PowerArea, PowerAreaFeatureCollection
+from power_map.power_grid import (
+        PowerGrid,
+        PowerGridCable,
+        PowerGridFeature,
+        PowerGridFeatureCollection,
+        PowerGridPDU,
+        PowerGridPDUFeature,
+        get_power_grid
+        )
+
+if TYPE_CHECKING:
+    from core.project import Project
+
+# Bumped when the stored state or how the grid is built changes, snapshots of
+# other versions are not used
+SNAPSHOT_VERSION = 3
+
+# Snapshots kept per project, older ones are deleted when a new one is saved
+POWER_GRID_SNAPSHOTS_KEEP = 16
+
+class GeoObjectState(BaseModel):
+    # Projected shape as WKB hex, so it doesn't have to be transformed again
+    shape_proj: Optional[str]
+
+class PowerAreaState(GeoObjectState):
+    area: PowerArea
+    parent: str
+    pdus: list[str]
+    cables: list[str]
+
+class PowerGridPDUState(GeoObjectState):
+    item: PowerGridPDU
+    areas: list[str]
+    cables: list[str]
+    cable_in: Optional[str]
+    cables_out: list[str]
+
+class PowerGridCableState(GeoObjectState):
+    item: PowerGridCable
+    areas: list[str]
+    pdus: list[str]
+    pdu_from: Optional[str]
+    pdu_to: Optional[str]
+    reversed: bool
+
+class PowerGridState(BaseModel):
+    """Built power grid with everything needed to update it incrementally.
+
+    pdus and cables are in the order of the top level area, every item is
+    there. Consumers are not included, get_power_grid doesn't add any.
+    """
+    timestamp: datetime
+    areas_revision_id: Optional[int]
+    grid_revision_id: Optional[int]
+    areas: list[PowerAreaState]
+    pdus: list[PowerGridPDUState]
+    cables: list[PowerGridCableState]
+    log_assign: list[ItemizedLogEntry]
+    log_connect: list[ItemizedLogEntry]
+    log_load: list[ItemizedLogEntry] = []
+    features: list[PowerGridFeature]
+    feature_shapes: list[str]
+    feature_items: dict[str, list[str]]
+    cable_pdus: dict[str, list[str]]
+    has_sources: Optional[bool]
+
+def _ids(items) -> list[str]:
+    return [item.id for item in items]
+
+def _shape_proj(obj: GeoObject) -> Optional[str]:
+    return shapely.to_wkb(obj.shape_proj, hex=True) if obj.geometry else None
+
+def _load_shapes(wkbs: list[Optional[str]]) -> list[Optional[shapely.Geometry]]:
+    return list(shapely.from_wkb(np.array(wkbs, dtype=object)))
+
+def dump_power_grid(grid: PowerGrid) -> PowerGridState:
+    areas = []
+    for parent in grid.areas_recursive():
+        for area in parent._areas.values():
+            areas.append(PowerAreaState(
+                area=area,
+                shape_proj=_shape_proj(area),
+                parent=parent.id,
+                pdus=_ids(area._pdus),
+                cables=_ids(area._cables)))
+
+    return PowerGridState(
+            timestamp=grid._timestamp,
+            areas_revision_id=grid._areas_revision_id,
+            grid_revision_id=grid._grid_revision_id,
+            areas=areas,
+            pdus=[PowerGridPDUState(
+                item=pdu,
+                shape_proj=_shape_proj(pdu),
+                areas=_ids(pdu._areas),
+                cables=_ids(pdu._cables),
+                cable_in=pdu.cable_in,
+                cables_out=pdu.cables_out) for pdu in grid._pdus],
+            cables=[PowerGridCableState(
+                item=cable,
+                shape_proj=_shape_proj(cable),
+                areas=_ids(cable._areas),
+                pdus=_ids(cable._pdus),
+                pdu_from=cable.pdu_from,
+                pdu_to=cable.pdu_to,
+                reversed=cable._reversed) for cable in grid._cables],
+            log_assign=grid._log_assign.entries,
+            log_connect=grid._log_connect.entries,
+            log_load=grid._log_load.entries,
+            features=list(grid._features.values()),
+            feature_shapes=list(shapely.to_wkb(list(grid._feature_shapes.values()), hex=True)),
+            feature_items={fid: _ids(items) for fid, items in grid._feature_items.items()},
+            cable_pdus={fid: sorted(pdus) for fid, pdus in grid._cable_pdus.items()},
+            has_sources=grid._has_sources)
+
+def load_power_grid(state: PowerGridState) -> PowerGrid:
+    grid = PowerGrid(timestamp=state.timestamp)
+    grid._areas_revision_id = state.areas_revision_id
+    grid._grid_revision_id = state.grid_revision_id
+
+    areas: dict[str, PowerArea] = {grid.id: grid}
+    for s in state.areas:
+        areas[s.area.id] = s.area
+        areas[s.parent]._areas[s.area.id] = s.area
+    pdus = {s.item.id: s.item for s in state.pdus}
+    cables = {s.item.id: s.item for s in state.cables}
+
+    grid._pdus = list(pdus.values())
+    grid._cables = list(cables.values())
+    for s in state.areas:
+        s.area._pdus = [pdus[i] for i in s.pdus]
+        s.area._cables = [cables[i] for i in s.cables]
+
+    for s in state.pdus:
+        pdu = s.item
+        pdu._areas = [areas[i] for i in s.areas]
+        pdu._cables = [cables[i] for i in s.cables]
+        pdu._cable_in = s.cable_in and cables[s.cable_in]
+        pdu._cables_out = [cables[i] for i in s.cables_out]
+    for s in state.cables:
+        cable = s.item
+        cable._areas = [areas[i] for i in s.areas]
+        cable._pdus = [pdus[i] for i in s.pdus]
+        cable._pdu_from = s.pdu_from and pdus[s.pdu_from]
+        cable._pdu_to = s.pdu_to and pdus[s.pdu_to]
+        cable._reversed = s.reversed
+
+    grid._log_assign.entries = state.log_assign
+    grid._log_connect.entries = state.log_connect
+    grid._log_load.entries = state.log_load
+    grid._log.entries = grid._log_assign.entries + grid._log_connect.entries + grid._log_load.entries
+
+    grid._features = {f.id: f for f in state.features}
+    grid._feature_shapes = dict(zip(grid._features, _load_shapes(state.feature_shapes)))
+    grid._feature_items = {
+            fid: [(pdus if isinstance(grid._features[fid], PowerGridPDUFeature) else cables)[i] for i in ids]
+            for fid, ids in state.feature_items.items()}
+    grid._cable_pdus = {fid: set(ids) for fid, ids in state.cable_pdus.items()}
+    grid._has_sources = state.has_sources
+
+    objects = [s for s in (*state.areas, *state.pdus, *state.cables) if s.shape_proj]
+    for s, shape_proj in zip(objects, _load_shapes([s.shape_proj for s in objects])):
+        (s.area if isinstance(s, PowerAreaState) else s.item).set_shape_proj(shape_proj)
+    return grid
+
+def copy_power_grid(grid: PowerGrid) -> PowerGrid:
+    """Independent copy of a built grid, that can be updated incrementally.
+
+    The state refers to the items of the grid, load_power_grid would relink
+    them in place, so it goes through JSON to get new ones.
+    """
+    state = dump_power_grid(grid)
+    return load_power_grid(PowerGridState.model_validate_json(state.model_dump_json()))
+
+def snapshot_version(project: 'Project') -> str:
+    """Snapshots are only valid for the same version and project config"""
+    return f'{SNAPSHOT_VERSION}-{project.config_hash}'
+
+class PowerGridSnapshotInDB(DBModel):
+    """Built power grid of a project, keyed by the last revisions of the
+    collections it was built from and snapshot_version"""
+    __tablename__ = 'power_grid_snapshot'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    project_id: Mapped[int] = mapped_column(ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
+    areas_revision_id: Mapped[Optional[int]] = mapped_column()
+    grid_revision_id: Mapped[Optional[int]] = mapped_column()
+    version: Mapped[str] = mapped_column(nullable=False, server_default='')
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    data: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<PowerGridSnapshotInDB[{self.id}]: project {self.project_id} at ({self.areas_revision_id}, {self.grid_revision_id})>"
+
+Index('idx_power_grid_snapshot_revisions',
+      PowerGridSnapshotInDB.project_id,
+      PowerGridSnapshotInDB.areas_revision_id,
+      PowerGridSnapshotInDB.grid_revision_id)
+
+async def load_power_grid_snapshot(
+        db: AsyncSession,
+        project_id: int,
+        version: str,
+        areas_revision_id: Optional[int],
+        grid_revision_id: Optional[int]
+        ) -> Optional[PowerGrid]:
+    data = await db.scalar(
+            select(PowerGridSnapshotInDB.data.cast(Text))
+            .where(
+                (PowerGridSnapshotInDB.project_id == project_id) &
+                (PowerGridSnapshotInDB.version == version) &
+                PowerGridSnapshotInDB.areas_revision_id.is_not_distinct_from(areas_revision_id) &
+                PowerGridSnapshotInDB.grid_revision_id.is_not_distinct_from(grid_revision_id))
+            .order_by(PowerGridSnapshotInDB.id.desc())
+            .limit(1))
+    if data is None:
+        return None
+    try:
+        state = PowerGridState.model_validate_json(data)
+    except ValidationError as e:
+        log.warning(f"Ignoring power grid snapshot of project {project_id}, {e.error_count()} validation errors")
+        return None
+    return load_power_grid(state)
+
+async def save_power_grid_snapshot(db: AsyncSession, project_id: int, version: str, grid: PowerGrid):
+    db.add(PowerGridSnapshotInDB(
+        project_id=project_id,
+        areas_revision_id=grid._areas_revision_id,
+        grid_revision_id=grid._grid_revision_id,
+        version=version,
+        data=dump_power_grid(grid).model_dump(mode='json')))
+    await db.flush()
+    keep = (
+            select(PowerGridSnapshotInDB.id)
+            .where(PowerGridSnapshotInDB.project_id == project_id)
+            .order_by(PowerGridSnapshotInDB.id.desc())
+            .limit(POWER_GRID_SNAPSHOTS_KEEP))
+    await db.execute(
+            delete(PowerGridSnapshotInDB)
+            .where(
+                (PowerGridSnapshotInDB.project_id == project_id) &
+                PowerGridSnapshotInDB.id.not_in(keep)))
+
+async def get_power_grid_stored(
+        project: 'Project',
+        timestamp: Optional[datetime] = None,
+        base: Optional[PowerGrid] = None
+        ) -> PowerGrid:
+    """Power grid of the project from a stored snapshot if there is one for
+    current revisions, otherwise built with get_power_grid and stored"""
+    db = project._db()
+    version = snapshot_version(project)
+    c_areas = await PowerAreaFeatureCollection.bind(project, False, time_end=timestamp)
+    c_grid = await PowerGridFeatureCollection.bind(project, False, time_end=timestamp)
+    areas_revision_id = await c_areas.last_revision_id()
+    grid_revision_id = await c_grid.last_revision_id()
+
+    if (base is not None and timestamp is None and
+            base._areas_revision_id == areas_revision_id and
+            base._grid_revision_id == grid_revision_id):
+        return base
+
+    grid = await load_power_grid_snapshot(db, project.id, version, areas_revision_id, grid_revision_id)
+    if grid:
+        log.debug(f"{project.name}: Loaded power grid snapshot at ({areas_revision_id}, {grid_revision_id})")
+        return grid
+
+    if base is not None and timestamp is None and base._areas_revision_id == areas_revision_id:
+        # Base may still be used by other requests and has to stay intact if
+        # the update fails, so a copy is updated
+        base = copy_power_grid(base)
+    else:
+        base = None
+    grid = await get_power_grid(project, timestamp=timestamp, base=base)
+    try:
+        async with db.begin_nested():
+            await save_power_grid_snapshot(db, project.id, version, grid)
+    except SQLAlchemyError as e:
+        log.warning(f"{project.name}: Failed to save power grid snapshot: {e}")
+    return grid
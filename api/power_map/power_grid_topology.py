@@ -0,0 +1,149 @@
+import numpy as np
+
+from power_map.power_grid_base import PowerGridItemSizeOrder
+from power_map.power_grid_cable import PowerGridCable
+from power_map.power_grid_pdu import PowerGridPDU
+
+NONE = -1
+
+def _size_codes(items: list[PowerGridPDU] | list[PowerGridCable]) -> np.ndarray:
+    return np.array([PowerGridItemSizeOrder.index(item.size.value) for item in items], dtype=np.int8)
+
+class PowerGridTopology:
+    """Connections of a power grid as index arrays.
+
+    PDUs and cables are numbered in the order of the lists the topology was
+    built from, NONE stands for a missing link. PDUs are also numbered in
+    depth-first order from the roots (power sources and PDUs without cable_in),
+    so PDUs fed through a PDU are a contiguous range of pdu_order and cables
+    fed through it a contiguous range of cable_order.
+    """
+    def __init__(self, pdus: list[PowerGridPDU], cables: list[PowerGridCable]):
+        self.pdus = pdus
+        self.cables = cables
+        self.pdu_index = {pdu.id: i for i, pdu in enumerate(pdus)}
+        self.cable_index = {cable.id: i for i, cable in enumerate(cables)}
+        n_pdus = len(pdus)
+        pdu_idx = {id(pdu): i for i, pdu in enumerate(pdus)}
+        cable_idx = {id(cable): i for i, cable in enumerate(cables)}
+
+        self.pdu_size = _size_codes(pdus)
+        self.pdu_native = np.array([pdu.native for pdu in pdus], dtype=bool)
+        self.pdu_power_source = np.array([pdu.power_source for pdu in pdus], dtype=bool)
+        self.cable_size = _size_codes(cables)
+        self.cable_native = np.array([cable.native for cable in cables], dtype=bool)
+        self.cable_length = np.array([cable.length_m for cable in cables], dtype=np.float64)
+
+        self.cable_from = np.array(
+                [pdu_idx.get(id(cable._pdu_from), NONE) for cable in cables], dtype=np.intp)
+        self.cable_to = np.array(
+                [pdu_idx.get(id(cable._pdu_to), NONE) for cable in cables], dtype=np.intp)
+        self.pdu_cable_in = np.array(
+                [cable_idx.get(id(pdu._cable_in), NONE) for pdu in pdus], dtype=np.intp)
+
+        # Cables out of PDU i are children[children_ptr[i]:children_ptr[i+1]]
+        self.children_ptr = np.zeros(n_pdus + 1, dtype=np.intp)
+        np.cumsum(np.array([len(pdu._cables_out) for pdu in pdus], dtype=np.intp), out=self.children_ptr[1:])
+        self.children = np.array(
+                [cable_idx.get(id(cable), NONE) for pdu in pdus for cable in pdu._cables_out], dtype=np.intp)
+        if (self.children == NONE).any():
+            raise ValueError("Power grid connections are inconsistent, PDUs feed cables that are not in the grid")
+
+        # Depth-first order, PDUs fed through PDU i are
+        # pdu_order[pdu_pos[i]:pdu_end[i]], i itself first
+        self.pdu_order = np.empty(n_pdus, dtype=np.intp)
+        self.pdu_pos = np.empty(n_pdus, dtype=np.intp)
+        self.pdu_end = np.empty(n_pdus, dtype=np.intp)
+        self.pdu_depth = np.zeros(n_pdus, dtype=np.intp)
+        self.pdu_root = np.empty(n_pdus, dtype=np.intp)
+        seen = np.zeros(n_pdus, dtype=bool)
+        pos = 0
+        for root in np.flatnonzero(self.pdu_cable_in == NONE).tolist():
+            self.pdu_root[root] = root
+            stack = [(root, False)]
+            while stack:
+                i, done = stack.pop()
+                if done:
+                    self.pdu_end[i] = pos
+                    continue
+                if seen[i]:
+                    raise ValueError(f"Power grid connections are not a forest, PDU {pdus[i].id} is fed more than once")
+                seen[i] = True
+                self.pdu_order[pos] = i
+                self.pdu_pos[i] = pos
+                pos += 1
+                stack.append((i, True))
+                out = self.children[self.children_ptr[i]:self.children_ptr[i + 1]]
+                out = out[self.cable_to[out] != NONE]
+                if ((self.cable_from[out] != i) | (self.pdu_cable_in[self.cable_to[out]] != out)).any():
+                    raise ValueError(f"Power grid connections are inconsistent, cables out of PDU {pdus[i].id} lead elsewhere")
+                for j in reversed(self.cable_to[out].tolist()):
+                    self.pdu_depth[j] = self.pdu_depth[i] + 1
+                    self.pdu_root[j] = self.pdu_root[i]
+                    stack.append((j, False))
+        if pos != n_pdus:
+            raise ValueError(f"Power grid connections are not a forest, {n_pdus - pos} PDUs unreachable from roots")
+
+        # Cables ordered by the position of their pdu_from, cables fed through
+        # PDU i are cable_order[pdu_cables_start[i]:pdu_cables_end[i]]
+        from_pos = np.full(len(cables), n_pdus, dtype=np.intp)
+        has_from = self.cable_from != NONE
+        from_pos[has_from] = self.pdu_pos[self.cable_from[has_from]]
+        self.cable_order = np.argsort(from_pos, kind='stable')
+        sorted_pos = from_pos[self.cable_order]
+        self.pdu_cables_start = np.searchsorted(sorted_pos, self.pdu_pos, side='left')
+        self.pdu_cables_end = np.searchsorted(sorted_pos, self.pdu_end, side='left')
+
+    def pdus_fed_by_pdu(self, pdu: int) -> np.ndarray:
+        return self.pdu_order[self.pdu_pos[pdu] + 1:self.pdu_end[pdu]]
+
+    def cables_fed_by_pdu(self, pdu: int) -> np.ndarray:
+        return self.cable_order[self.pdu_cables_start[pdu]:self.pdu_cables_end[pdu]]
+
+    def pdus_fed_by_cable(self, cable: int) -> np.ndarray:
+        pdu = self.cable_to[cable]
+        if pdu == NONE:
+            return self.pdu_order[:0]
+        return self.pdu_order[self.pdu_pos[pdu]:self.pdu_end[pdu]]
+
+    def cables_fed_by_cable(self, cable: int) -> np.ndarray:
+        pdu = self.cable_to[cable]
+        if pdu == NONE:
+            return self.cable_order[:0]
+        return self.cables_fed_by_pdu(pdu)
+
+    def source_of(self, pdu: int) -> int:
+        """Root of the tree the PDU is in, NONE if it's not a power source"""
+        root = self.pdu_root[pdu]
+        return root if self.pdu_power_source[root] else NONE
+
+    def path_to_source(self, pdu: int) -> np.ndarray:
+        """Cables from the PDU up to its root, nearest first"""
+        path = np.empty(self.pdu_depth[pdu], dtype=np.intp)
+        for k in range(len(path)):
+            path[k] = self.pdu_cable_in[pdu]
+            pdu = self.cable_from[path[k]]
+        return path
+
+    def downstream_cable_length(self) -> np.ndarray:
+        """Total length of cables fed through each PDU"""
+        total = np.concatenate(([0], np.cumsum(self.cable_length[self.cable_order])))
+        return total[self.pdu_cables_end] - total[self.pdu_cables_start]
+
+    def pdu_count_by_size(self, include_native: bool = False) -> np.ndarray:
+        """Number of PDUs indexed by size code"""
+        mask = include_native | ~self.pdu_native
+        return np.bincount(self.pdu_size[mask], minlength=len(PowerGridItemSizeOrder))
+
+    def cable_stats_by_size(self, include_native: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        """Number and total length of cables indexed by size code"""
+        mask = include_native | ~self.cable_native
+        sizes = self.cable_size[mask]
+        return (
+                np.bincount(sizes, minlength=len(PowerGridItemSizeOrder)),
+                np.bincount(sizes, weights=self.cable_length[mask], minlength=len(PowerGridItemSizeOrder)))
+
+__all__ = [
+        'NONE',
+        'PowerGridTopology'
+        ]
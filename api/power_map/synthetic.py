@@ -0,0 +1,105 @@
+import asyncstdlib as A
+from dataclasses import dataclass
+from math import ceil, sqrt
+from typing import Any, Iterable, TypeVar
+
+import shapely
+from geojson_pydantic import Feature
+from shapely.geometry import shape
+
+from core.importer.base import ImportContext
+from placement.importer import PlacementLoader
+from placement.types import PlacementEntityFeature
+from power_map.importer import PowerMapKML
+from power_map.power_area import PowerAreaFeature
+from power_map.power_grid import PowerGridFeature
+from project_configs.data_bl24 import BL24_IMPORTERS_POWER_MAP
+
+# Borderland layout the synthetic data is built from, files in project_data
+BASE_GRID_KML = 'bl24_grid.kml'
+BASE_PLACEMENT_JSON = 'bl24_entities.json'
+
+SYNTHETIC_SCALES = (1, 10, 100)
+
+# Gap between copies of the layout, relative to its size
+TILE_GAP = 0.1
+
+FeatureT = TypeVar('FeatureT', bound=Feature)
+
+@dataclass
+class SyntheticData:
+    areas: list[PowerAreaFeature]
+    grid: list[PowerGridFeature]
+    placement: list[PlacementEntityFeature]
+
+    def counts(self) -> dict[str, int]:
+        return {
+                'areas': len(self.areas),
+                'grid': len(self.grid),
+                'placement': len(self.placement),
+                }
+
+async def load_base_data() -> SyntheticData:
+    """Areas and grid features as the BL24 importers get them from the KML
+    and placement entities, with ids assigned the way a store would"""
+    ctx = ImportContext(db=None, user=None, project=None, loader=PowerMapKML(filename=BASE_GRID_KML, offline=True))
+    importer_areas, importer_grid = BL24_IMPORTERS_POWER_MAP[:2]
+    areas = await A.list(importer_areas.get_features_async(ctx))
+    grid = await A.list(importer_grid.get_features_async(ctx))
+    for n, f in enumerate(areas):
+        f.id = f"area_{n + 1}"
+    for n, f in enumerate(grid):
+        f.id = f"grid_{n + 1}"
+    placement = await PlacementLoader(filename=BASE_PLACEMENT_JSON, offline=True).get_features()
+    return SyntheticData(areas=areas, grid=grid, placement=placement)
+
+def _translate(coords: list[Any], dx: float, dy: float) -> list[Any]:
+    if coords and isinstance(coords[0], (int, float)):
+        return [coords[0] + dx, coords[1] + dy, *coords[2:]]
+    return [_translate(c, dx, dy) for c in coords]
+
+def translate_feature(f: FeatureT, dx: float, dy: float, **update: Any) -> FeatureT:
+    """Copy of the feature moved by dx, dy degrees, with properties updated"""
+    data = f.model_dump(mode='json', by_alias=True)
+    data['geometry']['coordinates'] = _translate(data['geometry']['coordinates'], dx, dy)
+    data['properties'].update(update)
+    return type(f).model_validate(data)
+
+def _copy_features(features: Iterable[FeatureT], copy: int, dx: float, dy: float, rename: bool = False) -> list[FeatureT]:
+    result = []
+    for f in features:
+        if copy and rename:
+            new = translate_feature(f, dx, dy, name=f"{f.properties.name} #{copy + 1}")
+        else:
+            new = translate_feature(f, dx, dy)
+        if copy:
+            new.id = f"{f.id}_{copy}"
+        result.append(new)
+    return result
+
+def generate(base: SyntheticData, scale: int) -> SyntheticData:
+    """Base layout repeated scale times side by side.
+
+    Copies are shifted so they don't touch each other, every copy gets its own
+    power sources and areas get unique names.
+    """
+    shapes = [shape(f.geometry) for f in (*base.areas, *base.grid, *base.placement)]
+    x0, y0, x1, y1 = shapely.total_bounds(shapes)
+    step_x, step_y = (x1 - x0) * (1 + TILE_GAP), (y1 - y0) * (1 + TILE_GAP)
+    columns = ceil(sqrt(scale))
+
+    result = SyntheticData(areas=[], grid=[], placement=[])
+    for copy in range(scale):
+        dx, dy = copy % columns * step_x, copy // columns * step_y
+        result.areas += _copy_features(base.areas, copy, dx, dy, rename=True)
+        result.grid += _copy_features(base.grid, copy, dx, dy)
+        result.placement += _copy_features(base.placement, copy, dx, dy)
+    return result
+
+__all__ = [
+        'SYNTHETIC_SCALES',
+        'SyntheticData',
+        'generate',
+        'load_base_data',
+        'translate_feature',
+        ]
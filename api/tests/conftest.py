@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Required settings, tests don't connect to the database
+os.environ.setdefault('DB_PASSWORD', 'test')
+os.environ.setdefault('SECRET_KEY', 'test')
+
+# Like the app, import core first, power_map modules import it back
+import core
+
+import asyncio
+
+import pytest
+
+from power_map.power_grid import PowerGrid
+from power_map.synthetic import SyntheticData, load_base_data
+
+@pytest.fixture(scope='session')
+def base_data() -> SyntheticData:
+    """BL24 layout from project_data"""
+    return asyncio.run(load_base_data())
+
+def build_grid(data: SyntheticData) -> PowerGrid:
+    grid = PowerGrid()
+    grid.add_area_features(data.areas)
+    grid.add_grid_features(data.grid)
+    return grid
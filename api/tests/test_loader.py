@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+from types import SimpleNamespace
+from typing import Optional
+
+import pytest
+
+import common.http_client
+from common.errors import ExternalError
+from core.importer.base import ImportContext, LoadFromUrlOrFile, LoaderStateInDB, SourceNotModified
+
+BODY = b'<kml>first</kml>'
+
+class SourceServer(ThreadingHTTPServer):
+    """Stand-in for an external source, answering with body"""
+    body: bytes = BODY
+    use_etag: bool = True
+    # Number of requests to fail with 503 before answering
+    fail: int = 0
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SourceHandler)
+        self.requests: list[dict[str, str]] = []
+        self.url = f'http://127.0.0.1:{self.server_address[1]}/source.kml'
+
+class SourceHandler(BaseHTTPRequestHandler):
+    server: SourceServer
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.server.fail:
+            self.server.fail -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        etag = f'"{hashlib.md5(self.server.body).hexdigest()}"'
+        if self.server.use_etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        if self.server.use_etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+class LoaderStateDB:
+    """Just enough of AsyncSession to keep loader state"""
+    def __init__(self):
+        self.states: dict[tuple[int, str, str], LoaderStateInDB] = {}
+
+    async def get(self, model, key):
+        return self.states.get(key)
+
+    def add(self, state: LoaderStateInDB):
+        self.states[(state.project_id, state.importer, state.source)] = state
+
+@pytest.fixture
+def server():
+    server = SourceServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(common.http_client, 'HTTP_BACKOFF', 0)
+
+@pytest.fixture
+def db():
+    return LoaderStateDB()
+
+def load(server: SourceServer, db: LoaderStateDB, importer: str = 'power_grid', force: bool = False) -> Optional[bytes]:
+    """Content as an import run with a fresh loader gets it, None if skipped"""
+    loader = LoadFromUrlOrFile(url=server.url)
+    ctx = ImportContext(
+            db=db,
+            user=None,
+            project=SimpleNamespace(id=1),
+            loader=loader,
+            force=force,
+            importer=SimpleNamespace(state_key=importer))
+    try:
+        return asyncio.run(loader.load(ctx=ctx))
+    except SourceNotModified:
+        return None
+
+def test_not_modified_response(server, db):
+    assert load(server, db) == BODY
+    assert load(server, db) is None
+    assert server.requests[-1]['If-None-Match'] == f'"{hashlib.md5(BODY).hexdigest()}"'
+
+def test_same_content_hash(server, db):
+    server.use_etag = False
+    assert load(server, db) == BODY
+    assert load(server, db) is None
+    assert len(server.requests) == 2
+
+    server.body = b'<kml>second</kml>'
+    assert load(server, db) == server.body
+
+def test_retry_server_error(server, db):
+    server.fail = 2
+    assert load(server, db) == BODY
+    assert len(server.requests) == 3
+
+def test_retries_exhausted(server, db):
+    server.fail = common.http_client.HTTP_RETRIES + 1
+    with pytest.raises(ExternalError):
+        load(server, db)
+
+def test_force(server, db):
+    assert load(server, db) == BODY
+    server.use_etag = False
+    server.body = b'<kml>second</kml>'
+    assert load(server, db, force=True) == server.body
+    assert 'If-None-Match' not in server.requests[-1]
+
+    # Validators are replaced along with the hash
+    state, = db.states.values()
+    assert state.etag is None
+    assert state.content_hash == hashlib.sha256(server.body).hexdigest()
+    assert load(server, db) is None
+
+def test_state_per_importer(server, db):
+    assert load(server, db, importer='power_grid') == BODY
+    assert load(server, db, importer='power_areas') == BODY
+    assert load(server, db, importer='power_grid') is None
+    assert load(server, db, importer='power_areas') is None
@@ -0,0 +1,29 @@
+from geojson_pydantic import Feature
+import shapely
+
+from core.importer.matching import KnownFeatures, with_shapes
+
+def features(*points, start=0):
+    return list(with_shapes(
+        Feature(type='Feature', id=f'f_{start + n}', geometry={'type': 'Point', 'coordinates': p}, properties={})
+        for n, p in enumerate(points)))
+
+def test_find_nearest():
+    known = KnownFeatures(features((0, 0), (1, 1), (2, 2)))
+    new, = features((1.1, 1.1), start=10)
+    assert known.find_nearest(new) == 1
+    known.take(1)
+    assert known.find_nearest(new) in (0, 2)
+
+def test_find_nearest_skips_empty_shapes():
+    items = features((0, 0), (1, 1))
+    items[1]._shape = shapely.Point()
+    known = KnownFeatures(items)
+    new, = features((1, 1), start=10)
+    assert known.find_nearest(new) == 0
+    known.take(0)
+    # Only the empty one left, no distance query ever finds it
+    assert known.find_nearest(new) is None
+
+    new._shape = shapely.Point()
+    assert known.find_nearest(new) is None
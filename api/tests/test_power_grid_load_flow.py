@@ -0,0 +1,39 @@
+import logging
+
+from power_map.power_grid_load_flow import MAX_VOLTAGE_DROP_PERCENT
+
+from conftest import build_grid
+
+def test_checks(base_data):
+    grid = build_grid(base_data)
+    grid.add_placement_features(base_data.placement)
+    load_flow = grid.load_flow
+
+    assert load_flow.pdu_total_load.sum() < load_flow.pdu_total_need.sum()
+    for e in grid._log_load.entries:
+        assert e.level >= logging.WARNING
+    drops = [e for e in grid._log_load.entries if e.message.startswith("Voltage drop")]
+    assert drops
+    # Only where the limit is first exceeded
+    assert len(drops) < (load_flow.pdu_voltage_drop > MAX_VOLTAGE_DROP_PERCENT).sum()
+
+def test_placement_features_one_by_one(base_data):
+    batch = build_grid(base_data)
+    batch.add_placement_features(base_data.placement)
+    grid = build_grid(base_data)
+    for f in base_data.placement:
+        grid.add_placement_feature(f)
+    grid.update_load_flow()
+    assert [e.message for e in grid._log_load.entries] == [e.message for e in batch._log_load.entries]
+
+def test_inconsistent_connections(base_data):
+    grid = build_grid(base_data)
+    cable = next(c for c in grid._cables if c._pdu_from and c._pdu_to)
+    other = next(c for c in grid._cables if c._pdu_from and c._pdu_to and c._pdu_to is not cable._pdu_to)
+    # Another cable out of a PDU leading to the PDU the first one feeds
+    other._pdu_to = cable._pdu_to
+    grid._topology = None
+    grid.update_load_flow()
+
+    assert [e.level for e in grid._log_load.entries] == [logging.ERROR]
+    assert grid._log_load.entries[0] in grid._log.entries
@@ -0,0 +1,32 @@
+import copy
+
+from power_map.power_grid import PowerGrid
+from power_map.power_grid_base import PowerItemBase
+from power_map.power_grid_snapshot import copy_power_grid
+
+from conftest import build_grid as build
+
+def grid_state(grid: PowerGrid):
+    return (
+            [item.to_geojson_feature(PowerItemBase.feature_properties).model_dump(mode='json') for item in grid.grid_items],
+            [(area.id, [i.id for i in area._pdus], [i.id for i in area._cables]) for area in grid.areas_recursive()],
+            [(e.item_id, e.level, e.message) for e in grid._log.entries])
+
+def test_copy_is_independent(base_data):
+    grid = build(base_data)
+    before = grid_state(grid)
+    copied = copy_power_grid(grid)
+
+    assert grid_state(copied) == before
+    originals = {id(item) for item in (*grid._pdus, *grid._cables, *grid.areas_recursive())}
+    assert not originals & {id(item) for item in (*copied._pdus, *copied._cables, *copied.areas_recursive())}
+
+    pdu = next(f for f in base_data.grid if f.geometry.type == 'Point')
+    moved = copy.deepcopy(pdu)
+    moved.geometry.coordinates = [moved.geometry.coordinates[0] + 0.0003, *moved.geometry.coordinates[1:]]
+    cable = next(f for f in base_data.grid if f.geometry.type == 'LineString')
+    copied.update_grid_features([moved], [cable.id])
+
+    assert grid_state(copied) != before
+    assert grid_state(grid) == before
+    assert grid_state(copy_power_grid(grid)) == before